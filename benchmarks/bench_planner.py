@@ -0,0 +1,123 @@
+"""
+Offline benchmark of the auto-event planning step (rdmass.planner.plan_events).
+
+    python benchmarks/bench_planner.py
+    python benchmarks/bench_planner.py --sizes 100 1000 --save baseline.json
+    python benchmarks/bench_planner.py --compare baseline.json --tolerance 0.25
+"""
+
+import argparse
+import arrow
+import json
+import os
+import random
+import sys
+import time
+import tracemalloc
+from typing import Dict, List, Set, Text
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from rdmass.planner import PlannerSettings, feed_dates, plan_events  # noqa: E402
+
+SETTINGS = PlannerSettings(types=["event", "community-day"], time_range=[8, 10], skip_diff=7200, timezone="UTC")
+TYPES = ["event", "community-day", "spotlight-hour", "raid-hour"]
+
+
+def synthetic_feed(size: int, seed: int = 0) -> List[Dict]:
+    rnd = random.Random(seed)
+    start = arrow.get("2024-01-01T00:00:00")
+    # events start on the hour, so many share dates like the real feed
+    return [
+        {
+            "name": f"Event {index}",
+            "type": rnd.choice(TYPES),
+            "has_quests": rnd.random() < 0.5,
+            "start": start.shift(hours=rnd.randrange(24 * 365)).format("YYYY-MM-DD HH:mm"),
+            "end": (
+                start.shift(hours=rnd.randrange(24 * 365)).format("YYYY-MM-DD HH:mm") if rnd.random() < 0.9 else None
+            ),
+        }
+        for index in range(size)
+    ]
+
+
+def synthetic_history(raw_events: List[Dict], seed: int = 0) -> Dict[Text, Set[Text]]:
+    rnd = random.Random(seed)
+    dates = feed_dates(raw_events, SETTINGS)
+    return {
+        "main": {date for date in dates if rnd.random() < 0.3},
+        "filtered": {date for date in dates if rnd.random() < 0.3},
+    }
+
+
+def bench(size: int, repeat: int) -> Dict:
+    raw_events = synthetic_feed(size)
+    past_event_dates = synthetic_history(raw_events)
+    now = arrow.get("2024-06-01T00:00:00")
+
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        plan = plan_events(raw_events, past_event_dates, SETTINGS, now)
+        timings.append(time.perf_counter() - start)
+
+    tracemalloc.start()
+    plan_events(raw_events, past_event_dates, SETTINGS, now)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return {
+        "size": size,
+        "best": min(timings),
+        "mean": sum(timings) / len(timings),
+        "peak_kib": peak / 1024,
+        "events": len(plan.events),
+        "filtered": len(plan.filtered_events),
+    }
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[100, 1000, 10000, 100000])
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--save", help="write results to json file")
+    parser.add_argument("--compare", help="compare best times against saved json file")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="allowed slowdown ratio for --compare")
+    args = parser.parse_args()
+
+    results = []
+    print(f"{'size':>8} {'best ms':>10} {'mean ms':>10} {'peak KiB':>10} {'events':>8} {'filtered':>8}")
+    for size in args.sizes:
+        result = bench(size, args.repeat)
+        results.append(result)
+        print(
+            f"{result['size']:>8} {result['best'] * 1000:>10.2f} {result['mean'] * 1000:>10.2f} "
+            f"{result['peak_kib']:>10.1f} {result['events']:>8} {result['filtered']:>8}"
+        )
+
+    if args.save:
+        with open(args.save, "w") as f:
+            json.dump(results, f, indent=2)
+
+    if args.compare:
+        with open(args.compare, "r") as f:
+            baseline = {row["size"]: row for row in json.load(f)}
+
+        regressions = [
+            result
+            for result in results
+            if result["size"] in baseline and result["best"] > baseline[result["size"]]["best"] * (1 + args.tolerance)
+        ]
+        for result in regressions:
+            print(
+                f"REGRESSION size={result['size']}: {result['best'] * 1000:.2f}ms vs "
+                f"{baseline[result['size']]['best'] * 1000:.2f}ms baseline"
+            )
+        return 1 if regressions else 0
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
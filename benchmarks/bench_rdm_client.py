@@ -0,0 +1,259 @@
+"""
+Load test of the RDM API client (rdmass.rdm) and assignment group dispatch against the local mock RDM.
+Mock runs in its own process, every scenario is driven by N concurrent callers.
+
+    python benchmarks/bench_rdm_client.py
+    python benchmarks/bench_rdm_client.py --concurrency 1 20 --requests 500 --latency 0.05 --error-rate 0.02
+    python benchmarks/bench_rdm_client.py --save baseline.json
+    python benchmarks/bench_rdm_client.py --compare baseline.json --tolerance 0.25
+
+--endpoint uses an already running mock (fleet options have to match the ones it was started with).
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Awaitable, Callable, Dict, List, Optional
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+MOCK = os.path.join(os.path.dirname(os.path.abspath(__file__)), "mock_rdm.py")
+
+SCENARIOS = ["get_devices", "get_instances", "assign_device", "assignment_group", "handle_assignment_group"]
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def start_mock(args: argparse.Namespace, port: int) -> subprocess.Popen:
+    command = [sys.executable, MOCK, "--port", str(port), "--username", "bench", "--password", "bench"]
+    for option in ("devices", "instances", "groups", "latency", "jitter", "error_rate"):
+        command += [f"--{option.replace('_', '-')}", str(getattr(args, option))]
+    process = subprocess.Popen(command, stdout=subprocess.DEVNULL)
+
+    deadline = time.monotonic() + 10
+    while time.monotonic() < deadline:
+        try:
+            socket.create_connection(("127.0.0.1", port), timeout=0.1).close()
+            return process
+        except OSError:
+            time.sleep(0.05)
+
+    process.kill()
+    raise RuntimeError("mock RDM didn't start")
+
+
+def write_config(workdir: str, endpoint: str, args: argparse.Namespace) -> str:
+    with open(os.path.join(ROOT, "config.example.json"), "r") as f:
+        config = json.load(f)
+
+    config["bot"]["log_level"] = "ERROR"
+    config["instance"]["rdm"].update(
+        {
+            "api_endpoint": endpoint,
+            "username": "bench",
+            "password": "bench",
+            "rate_limit": {"enabled": args.rate_limit},
+            "cache": {"enabled": args.cache},
+        }
+    )
+
+    config_path = os.path.join(workdir, "config.json")
+    with open(config_path, "w") as f:
+        json.dump(config, f)
+    return config_path
+
+
+def make_scenarios(args: argparse.Namespace) -> Dict[str, Callable[[int], Awaitable[bool]]]:
+    # rdmass reads its config on import, so it can't be imported before config is written
+    from rdmass.rdm import RDMGetApi, RDMSetApi
+    from rdmass.utils import handle_assignment_group
+
+    def device(index: int) -> str:
+        return f"device{index % args.devices:05d}"
+
+    def instance(index: int) -> str:
+        return f"Instance {index % args.instances}"
+
+    def group(index: int) -> str:
+        return f"Group {index % args.groups}"
+
+    async def get_devices(_: int) -> bool:
+        return await RDMGetApi.get_devices() is not None
+
+    async def get_instances(_: int) -> bool:
+        return await RDMGetApi.get_instances(skip_status=False) is not None
+
+    async def assign_device(index: int) -> bool:
+        return await RDMSetApi.assign_device(device(index), instance(index))
+
+    async def assignment_group(index: int) -> bool:
+        return await RDMSetApi.assignment_group(group(index), re_quest=index % 2 == 0)
+
+    async def assignment_group_batch(index: int) -> bool:
+        groups = [group(index * args.batch + offset) for offset in range(args.batch)]
+        report = await handle_assignment_group(groups, "request" if index % 2 == 0 else "start")
+        return all(report.results.values())
+
+    return {
+        "get_devices": get_devices,
+        "get_instances": get_instances,
+        "assign_device": assign_device,
+        "assignment_group": assignment_group,
+        "handle_assignment_group": assignment_group_batch,
+    }
+
+
+def percentiles(timings: List[float]) -> Dict[str, float]:
+    cuts = statistics.quantiles(timings, n=100) if len(timings) > 1 else timings * 99
+    return {"p50": cuts[49], "p95": cuts[94], "p99": cuts[98]}
+
+
+async def measure(call: Callable[[int], Awaitable[bool]], concurrency: int, requests: int) -> Dict:
+    timings: List[float] = []
+    errors = 0
+    issued = 0
+
+    async def caller() -> None:
+        nonlocal errors, issued
+
+        while issued < requests:
+            index = issued
+            issued += 1
+
+            start = time.perf_counter()
+            try:
+                success = await call(index)
+            except Exception:
+                # request errors and open circuit count as failed calls, the run goes on
+                success = False
+            timings.append(time.perf_counter() - start)
+            errors += not success
+
+    start = time.perf_counter()
+    await asyncio.gather(*[caller() for _ in range(concurrency)])
+    elapsed = time.perf_counter() - start
+
+    return {
+        "concurrency": concurrency,
+        "requests": requests,
+        "errors": errors,
+        "seconds": elapsed,
+        "throughput": requests / elapsed,
+        **percentiles(timings),
+    }
+
+
+async def run(args: argparse.Namespace) -> List[Dict]:
+    from rdmass.rdm import backends, close_client
+
+    scenarios = make_scenarios(args)
+    results = []
+
+    print(
+        f"{'scenario':<24} {'callers':>7} {'calls':>6} {'errors':>6} {'calls/s':>9} "
+        f"{'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8}"
+    )
+    for name in args.scenarios:
+        for concurrency in args.concurrency:
+            # every run starts with cold cache and closed circuit
+            for backend in backends.values():
+                backend.cache.clear()
+                backend.breaker.record_success()
+
+            result = {"scenario": name, **await measure(scenarios[name], concurrency, args.requests)}
+            results.append(result)
+            print(
+                f"{name:<24} {concurrency:>7} {result['requests']:>6} {result['errors']:>6} "
+                f"{result['throughput']:>9.1f} {result['p50'] * 1000:>8.1f} {result['p95'] * 1000:>8.1f} "
+                f"{result['p99'] * 1000:>8.1f}"
+            )
+
+    await close_client()
+    return results
+
+
+def compare(results: List[Dict], baseline_path: str, tolerance: float) -> int:
+    with open(baseline_path, "r") as f:
+        baseline = {(row["scenario"], row["concurrency"]): row for row in json.load(f)}
+
+    regressions = 0
+    for result in results:
+        base: Optional[Dict] = baseline.get((result["scenario"], result["concurrency"]))
+        if base is None:
+            continue
+
+        if result["p95"] > base["p95"] * (1 + tolerance) or result["throughput"] < base["throughput"] / (1 + tolerance):
+            regressions += 1
+            print(
+                f"REGRESSION {result['scenario']} x{result['concurrency']}: "
+                f"{result['throughput']:.1f} calls/s, p95 {result['p95'] * 1000:.1f}ms vs "
+                f"{base['throughput']:.1f} calls/s, p95 {base['p95'] * 1000:.1f}ms baseline"
+            )
+    return 1 if regressions else 0
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scenarios", nargs="+", choices=SCENARIOS, default=SCENARIOS)
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 10, 50], help="concurrent callers")
+    parser.add_argument("--requests", type=int, default=200, help="calls per scenario and concurrency")
+    parser.add_argument("--batch", type=int, default=10, help="groups per handle_assignment_group call")
+    parser.add_argument("--devices", type=int, default=2000)
+    parser.add_argument("--instances", type=int, default=200)
+    parser.add_argument("--groups", type=int, default=20)
+    parser.add_argument("--latency", type=float, default=0.01, help="mock RDM response latency in seconds")
+    parser.add_argument("--jitter", type=float, default=0.0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--cache", action="store_true", help="keep RDM response cache enabled")
+    parser.add_argument("--rate-limit", action="store_true", help="keep RDM rate limiter enabled")
+    parser.add_argument("--endpoint", help="use running mock RDM instead of starting one")
+    parser.add_argument("--save", help="write results to json file")
+    parser.add_argument("--compare", help="compare p95 and throughput against saved json file")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="allowed slowdown ratio for --compare")
+    args = parser.parse_args()
+
+    mock = None
+    endpoint = args.endpoint
+    if endpoint is None:
+        port = free_port()
+        mock = start_mock(args, port)
+        endpoint = f"http://127.0.0.1:{port}"
+
+    cwd = os.getcwd()
+    try:
+        with tempfile.TemporaryDirectory() as workdir:
+            os.environ["RDMASS_CONFIG"] = write_config(workdir, endpoint, args)
+            # history and jobstore files land in the throwaway directory
+            os.chdir(workdir)
+            sys.path.insert(0, ROOT)
+            try:
+                results = asyncio.run(run(args))
+            finally:
+                os.chdir(cwd)
+    finally:
+        if mock is not None:
+            mock.terminate()
+            mock.wait()
+
+    if args.save:
+        with open(args.save, "w") as f:
+            json.dump(results, f, indent=2)
+
+    if args.compare:
+        return compare(results, args.compare, args.tolerance)
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,106 @@
+"""
+Cold start benchmark: import of rdmass.bot until on_ready finished, without connecting to Discord.
+Every run is a fresh interpreter working in a temporary directory with a throwaway config.
+
+    python benchmarks/bench_startup.py
+    python benchmarks/bench_startup.py --repeat 10 --imports 15
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Dict, List
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+
+# background services would talk to RDM / open ports, they are not part of startup
+CONFIG_OVERRIDES = {
+    "auto_event": {"enabled": False},
+    "status_sampler": {"enabled": False},
+    "device_watchdog": {"enabled": False},
+    "loop_monitor": {"enabled": False},
+    "metrics": {"enabled": False},
+}
+
+
+def child() -> None:
+    start = time.perf_counter()
+    sys.path.insert(0, ROOT)
+
+    import rdmass.bot as bot
+    from rdmass.config import scheduler, startup_report
+
+    imported = time.perf_counter()
+    bot.client.loop.run_until_complete(bot.on_ready())
+    ready = time.perf_counter()
+
+    scheduler.shutdown(wait=False)
+    bot.client.loop.run_until_complete(bot.close_client())
+
+    print(json.dumps({"import": imported - start, "ready": ready - start, "phases": startup_report()}))
+
+
+def run(workdir: str, config_path: str, importtime: bool = False) -> subprocess.CompletedProcess:
+    env = dict(os.environ, RDMASS_CONFIG=config_path)
+    command = [sys.executable] + (["-X", "importtime"] if importtime else []) + [os.path.abspath(__file__), "--child"]
+    return subprocess.run(command, cwd=workdir, env=env, capture_output=True, text=True, check=True)
+
+
+def slowest_imports(stderr: str, top: int) -> List[str]:
+    rows = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative_us, name = line[len("import time:") :].split("|")
+        rows.append((int(cumulative_us), name.strip()))
+    return [f"{cumulative / 1000:>8.1f}ms {name}" for cumulative, name in sorted(rows, reverse=True)[:top]]
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--imports", type=int, default=0, help="show N slowest imports (cumulative)")
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        child()
+        return 0
+
+    with open(os.path.join(ROOT, "config.example.json"), "r") as f:
+        config = json.load(f)
+    config.update(CONFIG_OVERRIDES)
+
+    results: List[Dict] = []
+    with tempfile.TemporaryDirectory() as workdir:
+        config_path = os.path.join(workdir, "config.json")
+        with open(config_path, "w") as f:
+            json.dump(config, f)
+
+        print(f"{'run':>4} {'import ms':>10} {'ready ms':>10}  phases")
+        for index in range(args.repeat):
+            result = json.loads(run(workdir, config_path).stdout.splitlines()[-1])
+            results.append(result)
+            print(
+                f"{index + 1:>4} {result['import'] * 1000:>10.1f} {result['ready'] * 1000:>10.1f}  {result['phases']}"
+            )
+
+        print(
+            f"median import {statistics.median(row['import'] for row in results) * 1000:.1f}ms, "
+            f"ready {statistics.median(row['ready'] for row in results) * 1000:.1f}ms"
+        )
+
+        if args.imports:
+            print("slowest imports:")
+            print("\n".join(slowest_imports(run(workdir, config_path, importtime=True).stderr, args.imports)))
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,229 @@
+"""
+Local stand-in for RDM serving /api/get_data and /api/set_data over a synthetic fleet.
+Point instance.rdm.api_endpoint at it to run the bot or benchmarks without a real RDM.
+
+    python benchmarks/mock_rdm.py --port 9000 --devices 2000 --instances 300
+    python benchmarks/mock_rdm.py --latency 0.05 --jitter 0.05 --error-rate 0.02
+"""
+
+import argparse
+import asyncio
+import base64
+import random
+import sys
+import time
+from aiohttp import web
+from collections import Counter
+from typing import Dict, List, Optional
+
+INSTANCE_TYPES = ["auto_quest", "pokemon_iv", "circle_pokemon", "circle_raid"]
+
+
+class MockRDM:
+    def __init__(
+        self,
+        devices: int = 500,
+        instances: int = 100,
+        groups: int = 20,
+        latency: float = 0.0,
+        jitter: float = 0.0,
+        error_rate: float = 0.0,
+        username: Optional[str] = None,
+        password: Optional[str] = None,
+        seed: int = 0,
+    ) -> None:
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.auth = (
+            "Basic " + base64.b64encode(f"{username}:{password}".encode()).decode() if username is not None else None
+        )
+        self.random = random.Random(seed)
+        self.requests: Counter = Counter()
+
+        now = time.time()
+        self.instances = {
+            f"Instance {index}": {
+                "name": f"Instance {index}",
+                "type": INSTANCE_TYPES[index % len(INSTANCE_TYPES)],
+                "count": 0,
+                # real instances carry their whole area, it makes up most of the response size
+                "area": [[{"lat": 50 + point / 1000, "lon": 19 + index / 1000} for point in range(20)]],
+                "min_level": 30,
+                "max_level": 35,
+            }
+            for index in range(instances)
+        }
+        names = list(self.instances)
+        self.devices = {
+            f"device{index:05d}": {
+                "uuid": f"device{index:05d}",
+                "instance": names[index % len(names)] if names else None,
+                "host": f"10.0.{index // 250}.{index % 250}",
+                "last_seen": int(now - self.random.randrange(600)),
+                "last_lat": 50.0,
+                "last_lon": 19.0,
+                "account_username": f"account{index}",
+            }
+            for index in range(devices)
+        }
+        uuids = list(self.devices)
+        self.device_groups = {
+            f"Device Group {index}": {
+                "name": f"Device Group {index}",
+                "devices": uuids[index::groups] if groups else [],
+                "instances": [],
+            }
+            for index in range(groups)
+        }
+        self.assignment_groups = {
+            f"Group {index}": {
+                "name": f"Group {index}",
+                "assignments": (
+                    ", ".join(f"{names[(index + step) % len(names)]} at {8 + step}:00" for step in range(3))
+                    if names
+                    else ""
+                ),
+            }
+            for index in range(groups)
+        }
+
+    def instance_status(self, instance: Dict) -> Dict:
+        if instance["type"] == "auto_quest":
+            total = 500 + len(instance["name"]) * 10
+            return {"quests": {"current_count_db": self.random.randrange(total), "total_count": total}}
+        return {"scanned": self.random.randrange(1000)}
+
+    def status(self) -> Dict:
+        now = time.time()
+        # devices seen within 5 minutes count as online, IV instances scan part of the active pokemon
+        online = sum(now - device["last_seen"] < 300 for device in self.devices.values())
+        counts = Counter(device["instance"] for device in self.devices.values())
+        iv_devices = sum(counts[name] for name, row in self.instances.items() if row["type"] == "pokemon_iv")
+        active_total = online * 50 + self.random.randrange(100)
+        return {
+            "processing": {"current": self.random.randrange(100), "max": 100, "ignored": 0, "total": 10000},
+            "pokemon": {"active_iv": min(iv_devices * 40, active_total), "active_total": active_total},
+            "devices": {"online": online, "total": len(self.devices)},
+            "uptime": {"date": int(now) - 3600},
+        }
+
+    def get_data(self, query: Dict) -> Dict:
+        data = {}
+        if query.get("show_devices") == "true":
+            data["devices"] = list(self.devices.values())
+        if query.get("show_instances") == "true":
+            counts = Counter(device["instance"] for device in self.devices.values())
+            with_status = query.get("skip_instance_status") != "true"
+            data["instances"] = [
+                dict(row, count=counts[row["name"]], **({"status": self.instance_status(row)} if with_status else {}))
+                for row in self.instances.values()
+            ]
+        if query.get("show_assignmentgroups") == "true":
+            data["assignmentgroups"] = list(self.assignment_groups.values())
+        if query.get("show_devicegroups") == "true":
+            data["devicegroups"] = list(self.device_groups.values())
+        if query.get("show_status") == "true":
+            data["status"] = self.status()
+        return {"status": "ok", "data": data}
+
+    def set_data(self, query: Dict) -> Optional[web.Response]:
+        # None means the change was applied
+        if query.get("assign_device") == "true":
+            if query.get("device_name") not in self.devices or query.get("instance") not in self.instances:
+                return web.Response(status=404)
+            self.devices[query["device_name"]]["instance"] = query["instance"]
+
+        elif query.get("assign_device_group") == "true":
+            group = self.device_groups.get(query.get("device_group_name"))
+            if group is None or query.get("instance") not in self.instances:
+                return web.Response(status=404)
+            for uuid in group["devices"]:
+                self.devices[uuid]["instance"] = query["instance"]
+
+        elif "assignmentgroup_name" in query:
+            if query["assignmentgroup_name"] not in self.assignment_groups:
+                return web.Response(status=404)
+
+        elif query.get("reload_instances") != "true" and query.get("clear_all_quests") != "true":
+            return web.Response(status=400)
+
+        return None
+
+    async def handle(self, request: web.Request) -> web.Response:
+        endpoint = request.path.rsplit("/", 1)[-1]
+        self.requests[endpoint] += 1
+
+        if self.auth is not None and request.headers.get("Authorization") != self.auth:
+            return web.Response(status=401)
+
+        await asyncio.sleep(self.latency + self.random.uniform(0, self.jitter))
+        if self.random.random() < self.error_rate:
+            self.requests["errors"] += 1
+            return web.Response(status=self.random.choice([502, 503, 504]))
+
+        query = dict(request.query)
+        if endpoint == "get_data":
+            return web.json_response(self.get_data(query))
+
+        error = self.set_data(query)
+        return error or web.json_response({"status": "ok"})
+
+    def create_app(self) -> web.Application:
+        app = web.Application()
+        app.router.add_get("/api/get_data", self.handle)
+        app.router.add_get("/api/set_data", self.handle)
+        return app
+
+
+async def serve(rdm: MockRDM, host: str, port: int) -> None:
+    runner = web.AppRunner(rdm.create_app())
+    await runner.setup()
+    await web.TCPSite(runner, host, port).start()
+    print(
+        f"mock RDM with {len(rdm.devices)} devices, {len(rdm.instances)} instances, "
+        f"{len(rdm.assignment_groups)} groups on http://{host}:{port}",
+        flush=True,
+    )
+
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await runner.cleanup()
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=9000)
+    parser.add_argument("--devices", type=int, default=500)
+    parser.add_argument("--instances", type=int, default=100)
+    parser.add_argument("--groups", type=int, default=20, help="assignment groups and device groups")
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds added to every response")
+    parser.add_argument("--jitter", type=float, default=0.0, help="random extra latency up to seconds")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="share of requests answered with 502/503/504")
+    parser.add_argument("--username", help="require basic auth")
+    parser.add_argument("--password")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args(argv)
+
+    rdm = MockRDM(
+        devices=args.devices,
+        instances=args.instances,
+        groups=args.groups,
+        latency=args.latency,
+        jitter=args.jitter,
+        error_rate=args.error_rate,
+        username=args.username,
+        password=args.password,
+        seed=args.seed,
+    )
+    try:
+        asyncio.run(serve(rdm, args.host, args.port))
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
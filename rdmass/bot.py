@@ -1,27 +1,80 @@
+import aiofiles
+import aiofiles.os
 import arrow
+import asyncio
 import discord
-import httpx
-from apscheduler.jobstores.base import JobLookupError
+import os
 from discord_slash import SlashCommand, ComponentContext
-from discord_slash.model import ButtonStyle, SlashMessage
+from discord_slash.model import ButtonStyle, SlashCommandOptionType, SlashMessage
 from discord_slash.utils import manage_components
-from sentry_sdk import capture_exception
+from discord_slash.utils.manage_commands import create_choice, create_option
 from typing import Optional, List, Text
 
-from rdmass.config import permissions, config, scheduler
-from rdmass.rdm import RDMSetApi, RDMGetApi
+from rdmass import metrics
+from rdmass.catchup import reconcile_missed_jobs
+from rdmass.config import permissions, profiler_permissions, config, scheduler, logging, startup_phase, startup_report
+from rdmass.eventloop import LoopLagMonitor, run_blocking
+from rdmass.executor import ExecutionResult, executor, get_skipped_message
+from rdmass.metrics import AUTO_EVENTS_DURATION
+from rdmass.notify import create_notifier
+from rdmass.profiling import profiler, timeit
+from rdmass.rdm import RDMGetApi, backends, gather_backends, qualify, open_client, close_client
+from rdmass.resilience import SCHEDULED, with_priority
+from rdmass.sampler import sampler
+from rdmass.search import search_labels
 from rdmass.utils import (
     handle_bot_list,
+    get_backends_result_message,
     get_status_message,
     handle_dt_picker,
     handle_assignment_group,
+    handle_device_assignment,
+    get_assignment_message,
+    get_device_assignment_message,
+    edit_progress,
+    start_progress,
     scheduler_migration,
     handle_clean,
+    handle_reload,
     handle_auto_events,
 )
+from rdmass.watchdog import DeviceWatchdog
+from rdmass.workflow import run_quest_workflow
 
-client = discord.Client(intents=discord.Intents.all())
+log = logging.getLogger(__name__)
+
+
+class RDMAssClient(discord.Client):
+    async def close(self) -> None:
+        sampler.stop()
+        watchdog.stop()
+        loop_monitor.stop()
+        await metrics.stop_server()
+        await notifier.close()
+        await close_client()
+        await super().close()
+
+
+client = RDMAssClient(intents=discord.Intents.all())
 slash = SlashCommand(client, sync_commands=True)
+notifier = create_notifier(client)
+watchdog = DeviceWatchdog(notifier)
+loop_monitor = LoopLagMonitor(notifier)
+
+search_option = create_option(
+    name="search",
+    description="Only list entries matching this text",
+    option_type=SlashCommandOptionType.STRING,
+    required=False,
+)
+
+backend_option = create_option(
+    name="backend",
+    description="RDM backend",
+    option_type=SlashCommandOptionType.STRING,
+    required=False,
+    choices=[create_choice(name=name, value=name) for name in backends],
+)
 
 status_refresh_component = manage_components.create_actionrow(
     *[manage_components.create_button(custom_id="status_refresh", style=ButtonStyle.blue, label="Refresh")]
@@ -31,17 +84,51 @@ status_refresh_component = manage_components.create_actionrow(
 @client.event
 async def on_ready() -> None:
     print("RDMAss ready to shine!")
+    startup_phase("discord")
+
+    await open_client()
+    client.loop.create_task(RDMGetApi.warm_cache())
+
+    if config.status_sampler.enabled:
+        sampler.start()
+
+    if config.device_watchdog.enabled:
+        watchdog.start()
+
+    if config.loop_monitor.enabled:
+        loop_monitor.start()
+
+    # metrics are optional, failing endpoint (e.g. port in use) must not stop scheduler startup
+    if config.metrics.enabled:
+        try:
+            await metrics.start_server()
+        except Exception as e:
+            log.error(f"metrics endpoint failed to start: {type(e).__name__}: {e}")
+
+    # scheduler is built lazily, keep its slow setup off the event loop
+    await run_blocking(scheduler.setup, asyncio.get_event_loop())
 
     if not scheduler.running:
-        scheduler.start()
-        scheduler_migration()
+        scheduler.start(paused=True)
+        await run_blocking(metrics.instrument_scheduler, scheduler)
+        await run_blocking(scheduler_migration)
+
+        # replay jobs missed while bot was down before apscheduler drops them as misfired
+        if config.catchup.enabled:
+            await reconcile_missed_jobs(notifier)
+        scheduler.resume()
+        startup_phase("scheduler")
+        log.info(startup_report())
 
         if config.auto_event.enabled:
             if config.auto_event.check_every < 1 or config.auto_event.check_every > 60:
                 return log.error("handle_events failed - set check_every to value between 1, 60")
+            if config.auto_event.mode == "completion" and not config.auto_event.progress_instances:
+                return log.error("handle_events failed - completion mode needs progress_instances")
 
             await sched_handle_events()
-            scheduler.add_job(
+            await run_blocking(
+                scheduler.add_job,
                 id="handle_events",
                 name="events_cron",
                 func=sched_handle_events,
@@ -56,33 +143,28 @@ async def on_ready() -> None:
 async def on_component(ctx: ComponentContext) -> None:
     if ctx.custom_id == "status_refresh":
         status_ctx = await manage_components.wait_for_component(client, components=[status_refresh_component])
-        await status_ctx.edit_origin(content=await get_status_message(), components=[status_refresh_component])
+        await status_ctx.edit_origin(content=await get_status_message(live=True), components=[status_refresh_component])
 
 
 @client.event
+@timeit
+@with_priority(SCHEDULED)
 async def sched_assignment_group(assignments_groups: List[Text], action: Text) -> None:
-    success = await handle_assignment_group(assignments_groups, action)
+    # executor merges jobs firing together into minimal set of RDM calls
+    if config.executor.enabled:
+        result = await executor.submit(assignments_groups, action)
+    else:
+        result = ExecutionResult(report=await handle_assignment_group(assignments_groups, action))
+    report = result.report
 
     # handle tech message
-    if config.instance.discord.tech_channel:
-        tech_channel = await client.fetch_channel(config.instance.discord.tech_channel)
-
-        output_message = (
-            config.message.tech_channel_message_success if success else config.message.tech_channel_message_fail
-        ).format(
-            **{
-                "action": action,
-                "type": "Scheduled",
-                "assignments_groups": ", ".join(assignments_groups),
-            }
-        )
-
-        await tech_channel.send(output_message)
+    if result.skipped:
+        notifier.send(config.instance.discord.tech_channel, get_skipped_message(result, "Scheduled"))
+    if report.results:
+        notifier.send(config.instance.discord.tech_channel, get_assignment_message(report, "Scheduled"))
 
     # handle users message
-    if success and config.instance.discord.user_channel:
-        user_channel = await client.fetch_channel(config.instance.discord.user_channel)
-
+    if report.succeeded:
         output_message = (
             config.message.user_channel_message_request
             if action == "request"
@@ -91,44 +173,67 @@ async def sched_assignment_group(assignments_groups: List[Text], action: Text) -
             **{
                 "action": action,
                 "type": "Scheduled",
-                "assignments_groups": ", ".join(assignments_groups),
+                "assignments_groups": ", ".join(report.succeeded),
             }
         )
 
-        await user_channel.send(output_message)
+        notifier.send(config.instance.discord.user_channel, output_message)
+
+
+@client.event
+@timeit
+@with_priority(SCHEDULED)
+async def sched_assign_devices(
+    devices: List[Text], device_groups: List[Text], instance: Text, backend: Optional[Text] = None
+) -> None:
+    report = await handle_device_assignment(devices, device_groups, instance, backend=backend)
+
+    # handle tech message
+    notifier.send(
+        config.instance.discord.tech_channel,
+        get_device_assignment_message(report, instance, "Scheduled", len(devices), len(device_groups)),
+    )
 
 
 @client.event
+@timeit
+@with_priority(SCHEDULED)
 async def sched_handle_events() -> None:
-    return await handle_auto_events(client, sched_assignment_group)
+    with AUTO_EVENTS_DURATION.time():
+        return await handle_auto_events(notifier, sched_assignment_group, sched_quest_workflow)
 
 
 @client.event
-async def sched_clean() -> None:
-    success = await handle_clean()
+@timeit
+@with_priority(SCHEDULED)
+async def sched_quest_workflow(event_id: Text) -> None:
+    await run_quest_workflow(event_id, sched_assignment_group, notifier)
 
-    # handle tech message
-    if config.instance.discord.tech_channel:
-        tech_channel = await client.fetch_channel(config.instance.discord.tech_channel)
 
-        output_message = (
-            config.message.tech_channel_message_clean_success
-            if success
-            else config.message.tech_channel_message_clean_fail
-        )
+@client.event
+@timeit
+@with_priority(SCHEDULED)
+async def sched_clean(backend: Optional[Text] = None) -> None:
+    report = await handle_clean([backend] if backend else None)
 
-        await tech_channel.send(output_message)
+    # handle tech message
+    notifier.send(
+        config.instance.discord.tech_channel,
+        get_backends_result_message(
+            report, config.message.tech_channel_message_clean_success, config.message.tech_channel_message_clean_fail
+        ),
+    )
 
     # handle users message
-    if success and config.instance.discord.user_channel:
-        user_channel = await client.fetch_channel(config.instance.discord.user_channel)
+    if report.success:
+        notifier.send(config.instance.discord.user_channel, config.message.user_channel_message_clean)
 
-        await user_channel.send(config.message.user_channel_message_clean)
 
-
-@slash.slash(name="rdm-jobs", guild_ids=[config.instance.discord.guild_id], permissions=permissions)
-async def rdm_jobs(ctx: ComponentContext) -> Optional[SlashMessage]:
-    jobs = scheduler.get_jobs()
+@slash.slash(
+    name="rdm-jobs", guild_ids=[config.instance.discord.guild_id], permissions=permissions, options=[search_option]
+)
+async def rdm_jobs(ctx: ComponentContext, search: Optional[Text] = None) -> Optional[SlashMessage]:
+    jobs = await run_blocking(scheduler.get_jobs)
     job_names = {job.id: job.name for job in jobs}
 
     jobs = [
@@ -142,9 +247,12 @@ async def rdm_jobs(ctx: ComponentContext) -> Optional[SlashMessage]:
         for job in jobs
         if job.id != "handle_events"
     ]
+    jobs = search_labels(jobs, search)
 
     if not jobs:
-        return await ctx.send("No jobs scheduled.", hidden=config.bot.hide_bot_message)
+        return await ctx.send(
+            f"No jobs matching **{search}**." if search else "No jobs scheduled.", hidden=config.bot.hide_bot_message
+        )
 
     job_list_ctx, selected_jobs = await handle_bot_list(
         client, ctx, jobs, "Select jobs to remove", placeholder="...", custom_id="jobs_list"
@@ -153,9 +261,11 @@ async def rdm_jobs(ctx: ComponentContext) -> Optional[SlashMessage]:
     if not selected_jobs:
         return await job_list_ctx.edit_origin(content=f"Aborted.", components=None)
 
+    from apscheduler.jobstores.base import JobLookupError
+
     for job_id in selected_jobs:
         try:
-            scheduler.remove_job(job_id)
+            await run_blocking(scheduler.remove_job, job_id)
         except JobLookupError:
             pass
 
@@ -169,39 +279,37 @@ async def rdm_jobs(ctx: ComponentContext) -> Optional[SlashMessage]:
     guild_ids=[config.instance.discord.guild_id],
     permissions=permissions,
 )
+@timeit
 async def rdm_status(ctx: ComponentContext) -> None:
     await ctx.send(
         content=await get_status_message(), components=[status_refresh_component], hidden=config.bot.hide_bot_message
     )
 
 
-# noinspection PyUnboundLocalVariable
 @slash.slash(
     name="rdm-reload",
     description="RDM Reload All Instances",
     guild_ids=[config.instance.discord.guild_id],
     permissions=permissions,
+    options=[backend_option],
 )
-async def rdm_reload(ctx: ComponentContext) -> None:
-    try:
-        status = await RDMSetApi.reload_instances()
-    except httpx.RequestError as e:
-        capture_exception(e)
-        message = f"Instances reload failed!\nError: {e}"
-    else:
-        message = f"Instances {'reloaded!' if status else 'reload failed!'}"
-    finally:
-        await ctx.send(message, hidden=config.bot.hide_bot_message)
+@timeit
+async def rdm_reload(ctx: ComponentContext, backend: Optional[Text] = None) -> None:
+    report = await handle_reload([backend] if backend else None)
+    await ctx.send(
+        get_backends_result_message(report, "Instances reloaded!", "Instances reload failed!"),
+        hidden=config.bot.hide_bot_message,
+    )
 
 
-# noinspection PyUnboundLocalVariable
 @slash.slash(
     name="rdm-clear",
     description="RDM Clear All Quests",
     guild_ids=[config.instance.discord.guild_id],
     permissions=permissions,
+    options=[backend_option],
 )
-async def rdm_clear(ctx: ComponentContext) -> None:
+async def rdm_clear(ctx: ComponentContext, backend: Optional[Text] = None) -> None:
     cancel_button = manage_components.create_button(custom_id="cancel", style=ButtonStyle.gray, label="Cancel")
     action_type = manage_components.create_actionrow(
         *[
@@ -220,21 +328,20 @@ async def rdm_clear(ctx: ComponentContext) -> None:
         return await action_type_ctx.edit_origin(content="Aborted.", components=None)
 
     elif action == "instant":
-        try:
-            status = await RDMSetApi.clear_all_quests()
-        except httpx.RequestError as e:
-            capture_exception(e)
-            message = f"Quests cleanup failed!\nError: {type(e).__name__}: {e}"
-        else:
-            message = f"Quests {'cleaned!' if status else 'cleanup failed!'}"
-        finally:
-            await action_type_ctx.edit_origin(content=message, components=None, hidden=config.bot.hide_bot_message)
+        report = await handle_clean([backend] if backend else None)
+        await action_type_ctx.edit_origin(
+            content=get_backends_result_message(report, "Quests cleaned!", "Quests cleanup failed!"),
+            components=None,
+            hidden=config.bot.hide_bot_message,
+        )
 
     else:
         hours_ctx, arrow_dt_utc, arrow_dt = await handle_dt_picker(client, action_type_ctx)
-        scheduler_name = f"Clean Quests"
-        scheduler.add_job(
+        scheduler_name = f"Clean Quests [{backend}]" if backend else "Clean Quests"
+        await run_blocking(
+            scheduler.add_job,
             func=sched_clean,
+            args=[backend] if backend else [],
             trigger="date",
             run_date=arrow_dt_utc.datetime,
             name=scheduler_name,
@@ -252,21 +359,32 @@ async def rdm_clear(ctx: ComponentContext) -> None:
     description="RDM Assignment Group",
     guild_ids=[config.instance.discord.guild_id],
     permissions=permissions,
+    options=[search_option],
 )
-async def rdm_assignment_group(ctx: ComponentContext) -> Optional[SlashMessage]:
+async def rdm_assignment_group(ctx: ComponentContext, search: Optional[Text] = None) -> Optional[SlashMessage]:
     await ctx.defer(hidden=config.bot.hide_bot_message)
 
+    backend_groups = await gather_backends(lambda name: RDMGetApi.get_assignment_groups(backend=name))
     assignment_groups = [
         {
-            "label": row["name"],
-            "value": row["name"],
-            "description": row["assignments"][:100],
+            "label": qualify(backend, row.name),
+            "value": qualify(backend, row.name),
+            "description": row.assignments[:100],
         }
-        for row in await RDMGetApi.get_assignment_groups()
+        for backend, rows in backend_groups.items()
+        for row in rows or []
     ]
+    assignment_groups = search_labels(assignment_groups, search)
 
     if not assignment_groups:
-        return await ctx.send("There's no assignment groups in this RDM instance.", hidden=config.bot.hide_bot_message)
+        return await ctx.send(
+            (
+                f"No assignment groups matching **{search}**."
+                if search
+                else "There's no assignment groups in this RDM instance."
+            ),
+            hidden=config.bot.hide_bot_message,
+        )
 
     assignment_group_ctx, selected_assignments = await handle_bot_list(
         client,
@@ -329,25 +447,17 @@ async def rdm_assignment_group(ctx: ComponentContext) -> Optional[SlashMessage]:
         return await action_type_ctx.edit_origin(content="Aborted.", components=None)
 
     elif action_type_ctx.custom_id == "instant":
-        success = await handle_assignment_group(selected_assignments, action)
+        report = await handle_assignment_group(selected_assignments, action)
 
-        output_message = (
-            config.message.tech_channel_message_success if success else config.message.tech_channel_message_fail
-        ).format(
-            **{
-                "action": action,
-                "type": "Instant",
-                "assignments_groups": ", ".join(selected_assignments),
-            }
-        )
         return await action_type_ctx.edit_origin(
-            content=output_message,
+            content=get_assignment_message(report, "Instant"),
             components=None,
         )
     else:
         hours_ctx, arrow_dt_utc, arrow_dt = await handle_dt_picker(client, action_type_ctx)
         scheduler_name = f"{action} {', '.join(selected_assignments)}"
-        scheduler.add_job(
+        await run_blocking(
+            scheduler.add_job,
             func=sched_assignment_group,
             trigger="date" if action_type_ctx.custom_id == "schedule" else None,
             run_date=arrow_dt_utc.datetime if action_type_ctx.custom_id == "schedule" else None,
@@ -363,3 +473,167 @@ async def rdm_assignment_group(ctx: ComponentContext) -> Optional[SlashMessage]:
             content=f"New job **{scheduler_name}** added. Will be fired at **{arrow_dt.format(dt_format)}**",
             components=None,
         )
+
+
+@slash.slash(
+    name="rdm-assign-devices",
+    description="RDM Assign Devices & Device Groups",
+    guild_ids=[config.instance.discord.guild_id],
+    permissions=permissions,
+    options=[backend_option, search_option],
+)
+async def rdm_assign_devices(
+    ctx: ComponentContext, backend: Optional[Text] = None, search: Optional[Text] = None
+) -> Optional[SlashMessage]:
+    await ctx.defer(hidden=config.bot.hide_bot_message)
+
+    snapshot = await RDMGetApi.snapshot(devices=True, device_groups=True, instances=True, backend=backend)
+    if not snapshot or not snapshot.instances or not (snapshot.devices or snapshot.device_groups):
+        return await ctx.send(
+            "There's no devices or instances in this RDM instance.", hidden=config.bot.hide_bot_message
+        )
+
+    targets = [
+        {
+            "label": f"[Group] {row.name}",
+            "value": f"group:{row.name}",
+            "description": f"{len(row.devices)} devices",
+        }
+        for row in snapshot.device_groups or []
+    ] + [
+        {
+            "label": row.uuid,
+            "value": f"device:{row.uuid}",
+            "description": row.instance or "No instance",
+        }
+        for row in snapshot.devices or []
+    ]
+    targets = search_labels(targets, search)
+
+    if not targets:
+        return await ctx.send(f"No devices or device groups matching **{search}**.", hidden=config.bot.hide_bot_message)
+
+    targets_ctx, selected_targets = await handle_bot_list(
+        client, ctx, targets, "Select devices or device groups", placeholder="...", custom_id="device_targets"
+    )
+
+    if not selected_targets:
+        return await targets_ctx.edit_origin(content="Aborted.", components=None)
+
+    device_groups = sorted(target[6:] for target in selected_targets if target.startswith("group:"))
+    devices = sorted(target[7:] for target in selected_targets if target.startswith("device:"))
+
+    instances = [{"label": row.name, "value": row.name, "description": row.type} for row in snapshot.instances]
+
+    instance_ctx, selected_instances = await handle_bot_list(
+        client,
+        ctx,
+        instances,
+        "Select target instance",
+        placeholder="...",
+        custom_id="target_instance",
+        edit_component=targets_ctx,
+    )
+
+    if len(selected_instances) != 1:
+        return await instance_ctx.edit_origin(content="Aborted. Select exactly one instance.", components=None)
+
+    instance = selected_instances.pop()
+
+    cancel_button = manage_components.create_button(custom_id="cancel", style=ButtonStyle.gray, label="Cancel")
+    action_type = manage_components.create_actionrow(
+        *[
+            manage_components.create_button(custom_id="schedule", style=ButtonStyle.blue, label="Schedule"),
+            manage_components.create_button(custom_id="instant", style=ButtonStyle.blue, label="Instant"),
+            cancel_button,
+        ]
+    )
+
+    await instance_ctx.edit_origin(
+        content=f"Assign {len(devices)} devices and {len(device_groups)} device groups to **{instance}**",
+        components=[action_type],
+    )
+    action_type_ctx = await manage_components.wait_for_component(client, components=[action_type])
+
+    if action_type_ctx.custom_id == "cancel":
+        return await action_type_ctx.edit_origin(content="Aborted.", components=None)
+
+    elif action_type_ctx.custom_id == "instant":
+        progress_message = await start_progress(action_type_ctx, f"Assigning to **{instance}**...")
+        last_update = 0.0
+
+        async def progress(done: int, total: int) -> None:
+            nonlocal last_update
+
+            # throttle edits, discord allows only a few per second
+            if done == total or client.loop.time() - last_update > 1:
+                last_update = client.loop.time()
+                await edit_progress(progress_message, f"Assigning to **{instance}**... {done}/{total}")
+
+        report = await handle_device_assignment(devices, device_groups, instance, progress, backend=backend)
+
+        return await edit_progress(
+            progress_message,
+            get_device_assignment_message(report, instance, "Instant", len(devices), len(device_groups)),
+        )
+    else:
+        hours_ctx, arrow_dt_utc, arrow_dt = await handle_dt_picker(client, action_type_ctx)
+        scheduler_name = f"assign {len(devices) + len(device_groups)} devices/groups to {instance}"
+        await run_blocking(
+            scheduler.add_job,
+            func=sched_assign_devices,
+            trigger="date",
+            run_date=arrow_dt_utc.datetime,
+            args=[devices, device_groups, instance, backend],
+            name=scheduler_name,
+        )
+
+        dt_format = f"{config.locale.datetime_format}"
+        await hours_ctx.edit_origin(
+            content=f"New job **{scheduler_name}** added. Will be fired at **{arrow_dt.format(dt_format)}**",
+            components=None,
+        )
+
+
+@slash.slash(
+    name="rdm-profile",
+    description="Profile RDMAss event loop",
+    guild_ids=[config.instance.discord.guild_id],
+    permissions=profiler_permissions,
+    options=[
+        create_option(
+            name="seconds",
+            description="Profiling duration",
+            option_type=SlashCommandOptionType.INTEGER,
+            required=True,
+        ),
+        create_option(
+            name="output",
+            description="Where to send the summary",
+            option_type=SlashCommandOptionType.STRING,
+            required=False,
+            choices=[create_choice(name="Tech channel", value="channel"), create_choice(name="File", value="file")],
+        ),
+    ],
+)
+async def rdm_profile(ctx: ComponentContext, seconds: int, output: Text = "channel") -> None:
+    if profiler.running:
+        return await ctx.send("Profiler is already running.", hidden=True)
+
+    seconds = max(1, min(seconds, config.profiler.max_seconds))
+    await ctx.send(f"Profiling for {seconds}s...", hidden=True)
+
+    summary = (await profiler.profile(seconds)).format(config.profiler.top)
+
+    if output == "file":
+        await aiofiles.os.makedirs(config.profiler.output_dir, exist_ok=True)
+        path = os.path.join(config.profiler.output_dir, f"profile-{arrow.utcnow().format('YYYYMMDD-HHmmss')}.txt")
+        async with aiofiles.open(path, "w") as f:
+            await f.write(summary)
+        return await ctx.send(f"Profile saved to `{path}`", hidden=True)
+
+    notifier.send(config.instance.discord.tech_channel, summary)
+    await ctx.send("Profile sent to tech channel.", hidden=True)
+
+
+startup_phase("modules")
@@ -0,0 +1,94 @@
+import asyncio
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Hashable, Text, Tuple
+
+MISSING = object()
+
+
+class TTLCache:
+    def __init__(self, max_size: int = 128, enabled: bool = True) -> None:
+        self.max_size = max_size
+        self.enabled = enabled and max_size > 0
+        self.hits = 0
+        self.misses = 0
+        self._data: "OrderedDict[Tuple[Hashable, ...], Tuple[float, Any]]" = OrderedDict()
+        # bumped on every invalidation, reads started before a write must not cache their result
+        self._generations: Dict[Text, int] = {}
+
+    def get(self, key: Tuple[Hashable, ...]) -> Any:
+        if not self.enabled:
+            return MISSING
+
+        entry = self._data.get(key)
+        if entry is None or entry[0] <= time.monotonic():
+            if entry is not None:
+                del self._data[key]
+            self.misses += 1
+            return MISSING
+
+        self._data.move_to_end(key)
+        self.hits += 1
+        return entry[1]
+
+    def set(self, key: Tuple[Hashable, ...], value: Any, ttl: float) -> None:
+        if not self.enabled or ttl <= 0:
+            return
+
+        self._data[key] = (time.monotonic() + ttl, value)
+        self._data.move_to_end(key)
+
+        # drop least recently used entries above max_size
+        while len(self._data) > self.max_size:
+            self._data.popitem(last=False)
+
+    def generation(self, section: Text) -> int:
+        return self._generations.get(section, 0)
+
+    def invalidate(self, *sections: Text) -> None:
+        for section in sections:
+            self._generations[section] = self.generation(section) + 1
+
+        # keys are tuples where first element is the section name
+        for key in [key for key in self._data if key[0] in sections]:
+            del self._data[key]
+
+    def clear(self) -> None:
+        self._data.clear()
+
+    def stats(self) -> Dict[Text, int]:
+        return {"hits": self.hits, "misses": self.misses, "size": len(self._data)}
+
+
+class SingleFlight:
+    def __init__(self) -> None:
+        self.calls = 0
+        self.coalesced = 0
+        self._inflight: Dict[Hashable, asyncio.Future] = {}
+
+    async def do(self, key: Hashable, func: Callable[[], Awaitable[Any]]) -> Any:
+        future = self._inflight.get(key)
+        if future is not None:
+            self.coalesced += 1
+            return await asyncio.shield(future)
+
+        self.calls += 1
+        future = asyncio.ensure_future(func())
+        # mark exception as retrieved when every waiter got cancelled
+        future.add_done_callback(lambda f: f.cancelled() or f.exception())
+        self._inflight[key] = future
+
+        try:
+            # shield so cancelling the first caller does not fail the others
+            return await asyncio.shield(future)
+        finally:
+            if self._inflight.get(key) is future:
+                del self._inflight[key]
+
+    def discard(self, predicate: Callable[[Hashable], bool]) -> None:
+        # running calls finish for callers already waiting, new callers start a fresh one
+        for key in [key for key in self._inflight if predicate(key)]:
+            del self._inflight[key]
+
+    def stats(self) -> Dict[Text, int]:
+        return {"calls": self.calls, "coalesced": self.coalesced, "inflight": len(self._inflight)}
@@ -0,0 +1,127 @@
+import asyncio
+from dataclasses import dataclass, field
+from datetime import datetime
+from sentry_sdk import capture_exception
+from typing import Any, Dict, List, Optional, Text, Tuple
+
+from rdmass.config import config, logging, scheduler
+from rdmass.eventloop import run_blocking
+from rdmass.notify import Notifier
+
+log = logging.getLogger(__name__)
+
+
+@dataclass
+class CatchupPlan:
+    # (job, args to replay with)
+    replay: List[Tuple[Any, List]] = field(default_factory=list)
+    # (job, reason)
+    skipped: List[Tuple[Any, Text]] = field(default_factory=list)
+
+
+def is_assignment_job(job: Any) -> bool:
+    return job.func_ref.endswith(":sched_assignment_group")
+
+
+def is_clean_job(job: Any) -> bool:
+    return job.func_ref.endswith(":sched_clean")
+
+
+def is_workflow_job(job: Any) -> bool:
+    return job.func_ref.endswith(":sched_quest_workflow")
+
+
+def plan_catchup(missed: List[Any], now: datetime, max_age: float) -> CatchupPlan:
+    plan = CatchupPlan()
+    jobs = []
+
+    for job in sorted(missed, key=lambda job: job.next_run_time):
+        if (now - job.next_run_time).total_seconds() > max_age:
+            plan.skipped.append((job, "too old"))
+        else:
+            jobs.append(job)
+
+    job_ids = {job.id for job in jobs}
+    replay: Dict[Text, List] = {}
+    assigned_groups: Dict[Text, Text] = {}
+    # backend (None for all) -> latest missed clean
+    last_clean: Dict[Any, Any] = {}
+
+    # newest first, later state of a group wins over everything missed before it
+    for job in reversed(jobs):
+        if is_workflow_job(job) and f"{job.id[:-2]}-2" in job_ids:
+            plan.skipped.append((job, f"superseded by {job.id[:-2]}-2"))
+
+        elif is_assignment_job(job):
+            groups, action = job.args[0], job.args[1]
+
+            # auto event "{date}-2" IV start ends the "{date}-1" reQuest of the same event
+            if job.id.endswith("-1") and f"{job.id[:-2]}-2" in job_ids:
+                plan.skipped.append((job, f"superseded by {job.id[:-2]}-2"))
+                continue
+
+            remaining = [group for group in groups if group not in assigned_groups]
+            for group in groups:
+                assigned_groups.setdefault(group, job.id)
+
+            if not remaining:
+                plan.skipped.append((job, f"superseded by {', '.join(sorted({assigned_groups[g] for g in groups}))}"))
+                continue
+            replay[job.id] = [remaining, action]
+
+        elif is_clean_job(job):
+            backend = job.args[0] if job.args else None
+            if backend in last_clean or None in last_clean:
+                plan.skipped.append((job, f"superseded by {(last_clean.get(backend) or last_clean[None]).id}"))
+                continue
+            last_clean[backend] = job
+            replay[job.id] = list(job.args)
+
+        else:
+            replay[job.id] = list(job.args)
+
+    plan.replay = [(job, replay[job.id]) for job in jobs if job.id in replay]
+    plan.skipped.sort(key=lambda row: row[0].next_run_time)
+    return plan
+
+
+def format_catchup(plan: CatchupPlan) -> Text:
+    message = f"**[Catch-up]** {len(plan.replay)} missed jobs replayed, {len(plan.skipped)} skipped\n"
+    message += "".join(f":arrow_forward: {job.name}\n" for job, _ in plan.replay)
+    message += "".join(f":fast_forward: {job.name} ({reason})\n" for job, reason in plan.skipped)
+    return message
+
+
+async def reconcile_missed_jobs(notifier: Notifier) -> Optional[CatchupPlan]:
+    # scheduler has to be started paused, otherwise apscheduler drops misfired jobs first
+    from apscheduler.triggers.date import DateTrigger
+
+    now = datetime.now(tz=scheduler.timezone)
+    jobs = await run_blocking(scheduler.get_jobs)
+    missed = [
+        job for job in jobs if isinstance(job.trigger, DateTrigger) and job.next_run_time and job.next_run_time <= now
+    ]
+    if not missed:
+        return None
+
+    plan = plan_catchup(missed, now, config.catchup.max_age)
+    log.info(f"reconcile_missed_jobs - replaying {len(plan.replay)}, skipping {len(plan.skipped)} missed jobs")
+
+    # replayed jobs are removed up front so resumed scheduler won't fire them again
+    for job in missed:
+        await run_blocking(job.remove)
+
+    for job, args in plan.replay:
+        # quest workflow polls for hours, it can't hold up the startup
+        if is_workflow_job(job):
+            asyncio.ensure_future(job.func(*args, **job.kwargs))
+            continue
+
+        try:
+            await job.func(*args, **job.kwargs)
+        except Exception as e:
+            capture_exception(e)
+            log.exception(f"reconcile_missed_jobs - replay of {job.id} failed")
+
+    notifier.send(config.instance.discord.tech_channel, format_catchup(plan))
+    return plan
@@ -1,19 +1,38 @@
 import json
 import logging
 import os
-from apscheduler.schedulers.asyncio import AsyncIOScheduler
+import time
 from discord_slash.model import SlashCommandPermissionType
 from discord_slash.utils.manage_commands import create_permission
 from dotted_dict import DottedDict
-from pydantic.utils import deep_update
+from typing import Any, List, Optional, Text, Tuple
+
+# startup phases are measured from the first rdmass import
+startup_time = time.perf_counter()
+startup_phases: List[Tuple[Text, float]] = []
 
 # open config files
 script_path = os.path.dirname(os.path.abspath(__file__))
+config_path = os.environ.get("RDMASS_CONFIG", os.path.join(script_path, "..", "config.json"))
 past_events_path = os.path.join(script_path, "..", "past_events.json")
+events_cache_path = os.path.join(script_path, "..", "events_cache.json")
+jobs_db_path = "jobs.sqlite"
+
+
+def deep_update(mapping: dict, *updating_mappings: dict) -> dict:
+    output = mapping.copy()
+    for updating_mapping in updating_mappings:
+        for key, value in updating_mapping.items():
+            if isinstance(output.get(key), dict) and isinstance(value, dict):
+                output[key] = deep_update(output[key], value)
+            else:
+                output[key] = value
+    return output
+
 
 with open(os.path.join(script_path, "..", "default.json"), "r") as f:
     default_config = json.load(f)
-with open(os.path.join(script_path, "..", "config.json"), "r") as f:
+with open(config_path, "r") as f:
     user_config = json.load(f)
 
 # merge configs & DottedDict
@@ -32,24 +51,79 @@ for vendor_logger in ["asyncio", "discord", "discord_slash"]:
 discord_log = logging.getLogger("apscheduler")
 discord_log.setLevel(level=config.bot.apscheduler_log_level)
 
+
+def startup_phase(name: Text) -> None:
+    # reconnects fire on_ready again, only first occurrence counts
+    if name not in dict(startup_phases):
+        startup_phases.append((name, time.perf_counter()))
+
+
+def startup_report() -> Text:
+    previous = startup_time
+    phases = []
+    for name, at in startup_phases:
+        phases.append(f"{name} {(at - previous) * 1000:.0f}ms")
+        previous = at
+    return f"startup took {previous - startup_time:.3f}s ({', '.join(phases)})"
+
+
 # prepare permissions dict
-permissions = {
-    config.instance.discord.guild_id: [
-        create_permission(role_id, SlashCommandPermissionType.ROLE, True)
-        for role_id in config.instance.discord.enabled_roles
-    ]
-}
-permissions[config.instance.discord.guild_id].append(
-    create_permission(config.instance.discord.guild_id, SlashCommandPermissionType.ROLE, False)
-)
+def create_permissions(role_ids: list) -> dict:
+    output = {
+        config.instance.discord.guild_id: [
+            create_permission(role_id, SlashCommandPermissionType.ROLE, True) for role_id in role_ids
+        ]
+    }
+    output[config.instance.discord.guild_id].append(
+        create_permission(config.instance.discord.guild_id, SlashCommandPermissionType.ROLE, False)
+    )
+    return output
+
+
+permissions = create_permissions(config.instance.discord.enabled_roles)
+# profiler is restricted to its own roles, falls back to regular command roles
+profiler_permissions = create_permissions(config.profiler.enabled_roles or config.instance.discord.enabled_roles)
+
+
+class LazyScheduler:
+    # APScheduler import & sqlalchemy jobstore setup are slow, build scheduler on first use
+    def __init__(self) -> None:
+        self._scheduler = None
+
+    def setup(self, event_loop: Optional[Any] = None) -> Any:
+        if self._scheduler is None:
+            from apscheduler.schedulers.asyncio import AsyncIOScheduler
+
+            scheduler_config = {
+                "apscheduler.jobstores.default": {"type": "sqlalchemy", "url": f"sqlite:///{jobs_db_path}"},
+                "apscheduler.timezone": "UTC",
+            }
+            if event_loop is not None:
+                scheduler_config["event_loop"] = event_loop
+
+            self._scheduler = AsyncIOScheduler(scheduler_config)
+        return self._scheduler
+
+    def __getattr__(self, name: Text) -> Any:
+        return getattr(self.setup(), name)
+
 
 # scheduler configuration
-scheduler = AsyncIOScheduler(
-    {
-        "apscheduler.jobstores.default": {"type": "sqlalchemy", "url": "sqlite:///jobs.sqlite"},
-        "apscheduler.timezone": "UTC",
-    }
-)
+scheduler = LazyScheduler()
+
 
+startup_phase("config")
 
-__all__ = ["config", "permissions", "scheduler", "logging", "past_events_path"]
+__all__ = [
+    "config",
+    "permissions",
+    "profiler_permissions",
+    "scheduler",
+    "logging",
+    "past_events_path",
+    "events_cache_path",
+    "jobs_db_path",
+    "deep_update",
+    "startup_phase",
+    "startup_report",
+]
@@ -0,0 +1,89 @@
+import asyncio
+import functools
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Optional, Text, TypeVar
+
+from rdmass.config import config, logging
+from rdmass.metrics import LOOP_LAG, LOOP_STALLS
+from rdmass.notify import Notifier
+from rdmass.profiling import call_site, own_frame
+
+log = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+# sqlite jobstore, history db and heavy parsing run here instead of on the loop serving discord gateway
+blocking_executor = ThreadPoolExecutor(max_workers=config.bot.blocking_workers, thread_name_prefix="rdmass-blocking")
+
+
+async def run_blocking(func: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+    return await asyncio.get_event_loop().run_in_executor(blocking_executor, functools.partial(func, *args, **kwargs))
+
+
+class LoopLagMonitor:
+    def __init__(self, notifier: Notifier) -> None:
+        self.notifier = notifier
+        self.settings = config.loop_monitor
+        self._beat = 0.0
+        self._stall_site: Optional[Text] = None
+        self._last_notify = 0.0
+        self._stop = threading.Event()
+        self._task: Optional[asyncio.Task] = None
+
+    def watch(self, thread_id: int) -> None:
+        # loop can't report on itself while blocked, watcher thread grabs its stack mid-stall
+        captured = None
+        while not self._stop.wait(self.settings.threshold / 2):
+            beat = self._beat
+            if beat == captured or time.monotonic() - beat < self.settings.interval + self.settings.threshold:
+                continue
+
+            frame = sys._current_frames().get(thread_id)
+            if frame is not None:
+                own = own_frame(frame)
+                self._stall_site = call_site(frame) + (f" via {call_site(own)}" if own and own is not frame else "")
+                captured = beat
+
+    def report(self, lag: float) -> None:
+        site, self._stall_site = self._stall_site, None
+        LOOP_STALLS.inc()
+
+        message = f"event loop stalled for {lag:.3f}s" + (f" at {site}" if site else "")
+        log.warning(f"LoopLagMonitor - {message}")
+
+        now = time.monotonic()
+        if self.settings.notify and now - self._last_notify > self.settings.notify_cooldown:
+            self._last_notify = now
+            self.notifier.send(config.instance.discord.tech_channel, f"**[Loop]** {message}")
+
+    async def run(self) -> None:
+        loop = asyncio.get_event_loop()
+
+        while True:
+            start = loop.time()
+            self._beat = time.monotonic()
+            self._stall_site = None
+            await asyncio.sleep(self.settings.interval)
+
+            lag = max(loop.time() - start - self.settings.interval, 0)
+            LOOP_LAG.observe(lag)
+            if lag >= self.settings.threshold:
+                self.report(lag)
+
+    def start(self) -> None:
+        if self._task is None or self._task.done():
+            self._stop.clear()
+            threading.Thread(
+                target=self.watch, args=(threading.get_ident(),), name="rdmass-loop-monitor", daemon=True
+            ).start()
+            self._task = asyncio.ensure_future(self.run())
+            log.debug(f"LoopLagMonitor started, threshold {self.settings.threshold}s")
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
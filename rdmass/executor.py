@@ -0,0 +1,115 @@
+import asyncio
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Text, Tuple
+
+from rdmass.config import config, logging
+from rdmass.utils import AssignmentReport, handle_assignment_group
+
+log = logging.getLogger(__name__)
+
+# reQuest goes out before start, matching auto event order
+ACTION_ORDER = ("request", "start")
+CONFLICT_RULES = ("last", "request", "start")
+
+
+@dataclass
+class ExecutionResult:
+    report: AssignmentReport
+    # group -> reason it wasn't sent for this job
+    skipped: Dict[Text, Text] = field(default_factory=dict)
+
+
+def resolve_actions(batch: List[Tuple[List[Text], Text]], conflict_rule: Text) -> Dict[Text, Tuple[Text, int]]:
+    # group -> (final action, index of job owning the call)
+    output: Dict[Text, Tuple[Text, int]] = {}
+
+    for index, (groups, action) in enumerate(batch):
+        for group in groups:
+            current = output.get(group)
+            if current is None:
+                output[group] = (action, index)
+            elif current[0] != action and conflict_rule in ("last", action):
+                output[group] = (action, index)
+
+    return output
+
+
+class AssignmentExecutor:
+    def __init__(self, window: float, conflict_rule: Text) -> None:
+        if conflict_rule not in CONFLICT_RULES:
+            raise ValueError(f"executor.conflict_rule must be one of {', '.join(CONFLICT_RULES)}")
+
+        self.window = window
+        self.conflict_rule = conflict_rule
+        self._pending: List[Tuple[List[Text], Text, asyncio.Future]] = []
+        self._batch: Optional[asyncio.Task] = None
+        # batches never overlap, so each group sees its calls in order
+        self._lock = asyncio.Lock()
+
+    async def submit(self, groups: List[Text], action: Text) -> ExecutionResult:
+        future = asyncio.get_event_loop().create_future()
+        self._pending.append((list(groups), action, future))
+
+        if self._batch is None:
+            self._batch = asyncio.ensure_future(self.run_batch())
+
+        return await future
+
+    async def run_batch(self) -> None:
+        # jobs fired within the window are merged into one batch
+        await asyncio.sleep(self.window)
+        batch, self._pending, self._batch = self._pending, [], None
+
+        async with self._lock:
+            try:
+                results = await self.execute([(groups, action) for groups, action, _ in batch])
+            except Exception as e:
+                for _, _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+                return
+
+        for index, (groups, action, future) in enumerate(batch):
+            if not future.done():
+                future.set_result(results[index])
+
+    async def execute(self, batch: List[Tuple[List[Text], Text]]) -> List[ExecutionResult]:
+        final = resolve_actions(batch, self.conflict_rule)
+        outcome: Dict[Text, bool] = {}
+
+        for action in ACTION_ORDER:
+            groups = sorted(group for group, (final_action, _) in final.items() if final_action == action)
+            if groups:
+                outcome.update((await handle_assignment_group(groups, action)).results)
+
+        output = []
+        for index, (groups, action) in enumerate(batch):
+            result = ExecutionResult(report=AssignmentReport(action))
+            for group in groups:
+                final_action, owner = final[group]
+                if final_action != action:
+                    result.skipped[group] = f"superseded by {final_action}"
+                elif owner != index:
+                    result.skipped[group] = "duplicate"
+                else:
+                    result.report.results[group] = outcome[group]
+            output.append(result)
+
+        log.debug(
+            f"AssignmentExecutor - {len(batch)} jobs merged into {len(final)} calls "
+            f"({sum(len(groups) for groups, _ in batch)} requested)"
+        )
+        return output
+
+
+def get_skipped_message(result: ExecutionResult, job_type: Text) -> Text:
+    return config.message.tech_channel_message_skipped.format(
+        **{
+            "action": result.report.action,
+            "type": job_type,
+            "skipped_groups": ", ".join(f"{group} ({reason})" for group, reason in result.skipped.items()),
+        }
+    )
+
+
+executor = AssignmentExecutor(window=config.executor.window, conflict_rule=config.executor.conflict_rule)
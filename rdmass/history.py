@@ -0,0 +1,100 @@
+import os
+import simplejson as json
+import sqlite3
+import time
+from typing import Dict, Iterable, List, Optional, Set, Text
+
+from rdmass.config import jobs_db_path, logging
+
+log = logging.getLogger(__name__)
+
+# stay below SQLITE_MAX_VARIABLE_NUMBER of older sqlite builds
+CHUNK_SIZE = 500
+
+KINDS = ("main", "filtered")
+
+
+def chunks(rows: List[Text]) -> Iterable[List[Text]]:
+    for index in range(0, len(rows), CHUNK_SIZE):
+        yield rows[index : index + CHUNK_SIZE]
+
+
+class EventHistory:
+    def __init__(self, path: Text) -> None:
+        self.path = path
+        self._connection: Optional[sqlite3.Connection] = None
+
+    @property
+    def connection(self) -> sqlite3.Connection:
+        if self._connection is None:
+            self._connection = sqlite3.connect(self.path, check_same_thread=False)
+            with self._connection:
+                self._connection.execute(
+                    "CREATE TABLE IF NOT EXISTS past_events ("
+                    "date TEXT NOT NULL, kind TEXT NOT NULL, last_seen REAL NOT NULL, PRIMARY KEY (date, kind))"
+                )
+                self._connection.execute("CREATE INDEX IF NOT EXISTS past_events_last_seen ON past_events (last_seen)")
+        return self._connection
+
+    def known(self, dates: Iterable[Text]) -> Dict[Text, Set[Text]]:
+        output = {kind: set() for kind in KINDS}
+
+        for chunk in chunks(list(set(dates))):
+            rows = self.connection.execute(
+                f"SELECT date, kind FROM past_events WHERE date IN ({', '.join('?' * len(chunk))})", chunk
+            )
+            for date, kind in rows:
+                output[kind].add(date)
+
+        return output
+
+    def add(self, dates: Iterable[Text], kind: Text) -> None:
+        now = time.time()
+        with self.connection:
+            self.connection.executemany(
+                "INSERT OR REPLACE INTO past_events (date, kind, last_seen) VALUES (?, ?, ?)",
+                [(date, kind, now) for date in set(dates)],
+            )
+
+    def touch(self, dates: Iterable[Text]) -> None:
+        # dates still present in the feed never expire
+        now = time.time()
+        with self.connection:
+            for chunk in chunks(list(set(dates))):
+                self.connection.execute(
+                    f"UPDATE past_events SET last_seen = ? WHERE date IN ({', '.join('?' * len(chunk))})",
+                    [now, *chunk],
+                )
+
+    def prune(self, retention: float) -> int:
+        with self.connection:
+            cursor = self.connection.execute("DELETE FROM past_events WHERE last_seen < ?", (time.time() - retention,))
+
+        if cursor.rowcount:
+            log.debug(f"EventHistory - pruned {cursor.rowcount} past events")
+        return cursor.rowcount
+
+    def import_legacy(self, path: Text) -> None:
+        if not os.path.exists(path):
+            return
+
+        with open(path, "r") as f:
+            past_event_dates = json.load(f)
+
+        # old format was a flat list of main dates
+        if isinstance(past_event_dates, list):
+            past_event_dates = {"main": past_event_dates, "filtered": []}
+
+        for kind in KINDS:
+            self.add(past_event_dates.get(kind, []), kind)
+
+        os.replace(path, f"{path}.imported")
+        log.info(f"EventHistory - imported {path}")
+
+    def close(self) -> None:
+        if self._connection is not None:
+            self._connection.close()
+            self._connection = None
+
+
+history = EventHistory(jobs_db_path)
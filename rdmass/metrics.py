@@ -0,0 +1,240 @@
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, Iterator, List, Optional, Sequence, Text, Tuple
+
+from rdmass.config import config, logging
+
+log = logging.getLogger(__name__)
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 300)
+
+registry: List["Metric"] = []
+# callbacks refreshing gauges right before metrics are rendered
+collectors: List[Callable[[], None]] = []
+
+
+def escape(value: Text) -> Text:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def format_labels(labels: Sequence[Tuple[Text, Text]]) -> Text:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{name}="{escape(value)}"' for name, value in labels) + "}"
+
+
+def format_value(value: float) -> Text:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Metric:
+    kind = "untyped"
+
+    def __init__(self, name: Text, documentation: Text, labels: Sequence[Text] = ()) -> None:
+        self.name = name
+        self.documentation = documentation
+        self.labels = tuple(labels)
+        registry.append(self)
+
+    def key(self, labels: Dict[Text, object]) -> Tuple[Text, ...]:
+        return tuple(str(labels[name]) for name in self.labels)
+
+    def samples(self) -> Iterator[Tuple[Text, Sequence[Tuple[Text, Text]], float]]:
+        raise NotImplementedError
+
+    def render(self) -> Text:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        lines += [f"{name}{format_labels(labels)} {format_value(value)}" for name, labels, value in self.samples()]
+        return "\n".join(lines)
+
+
+class Counter(Metric):
+    kind = "counter"
+
+    def __init__(self, name: Text, documentation: Text, labels: Sequence[Text] = ()) -> None:
+        super().__init__(name, documentation, labels)
+        self.values: Dict[Tuple[Text, ...], float] = {}
+
+    def inc(self, amount: float = 1, **labels: object) -> None:
+        key = self.key(labels)
+        self.values[key] = self.values.get(key, 0) + amount
+
+    def samples(self) -> Iterator[Tuple[Text, Sequence[Tuple[Text, Text]], float]]:
+        for key, value in self.values.items():
+            yield self.name, list(zip(self.labels, key)), value
+
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def set(self, value: float, **labels: object) -> None:
+        self.values[self.key(labels)] = value
+
+
+class Histogram(Metric):
+    kind = "histogram"
+
+    def __init__(
+        self, name: Text, documentation: Text, labels: Sequence[Text] = (), buckets: Sequence[float] = DEFAULT_BUCKETS
+    ) -> None:
+        super().__init__(name, documentation, labels)
+        self.buckets = tuple(sorted(buckets)) + (float("inf"),)
+        # key -> (bucket counts, sum, count)
+        self.values: Dict[Tuple[Text, ...], List] = {}
+
+    def observe(self, value: float, **labels: object) -> None:
+        key = self.key(labels)
+        row = self.values.setdefault(key, [[0] * len(self.buckets), 0.0, 0])
+
+        for index, bound in enumerate(self.buckets):
+            if value <= bound:
+                row[0][index] += 1
+                break
+        row[1] += value
+        row[2] += 1
+
+    @contextmanager
+    def time(self, **labels: object) -> Iterator[None]:
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def samples(self) -> Iterator[Tuple[Text, Sequence[Tuple[Text, Text]], float]]:
+        for key, (counts, total, count) in self.values.items():
+            labels = list(zip(self.labels, key))
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, counts):
+                cumulative += bucket_count
+                yield f"{self.name}_bucket", labels + [("le", format_value(bound))], cumulative
+            yield f"{self.name}_sum", labels, total
+            yield f"{self.name}_count", labels, count
+
+
+def render() -> Text:
+    for collector in collectors:
+        try:
+            collector()
+        except Exception:
+            log.exception("metrics collector failed")
+
+    return "\n".join(metric.render() for metric in registry) + "\n"
+
+
+# RDM API
+RDM_REQUEST_DURATION = Histogram(
+    "rdmass_rdm_request_duration_seconds", "RDM API request latency", ["backend", "endpoint"]
+)
+RDM_REQUEST_ERRORS = Counter(
+    "rdmass_rdm_request_errors_total", "RDM API failed requests", ["backend", "endpoint", "error"]
+)
+RDM_CACHE = Gauge("rdmass_rdm_cache", "RDM read cache counters", ["backend", "stat"])
+RDM_COALESCE = Gauge("rdmass_rdm_coalesce", "RDM request coalescing counters", ["backend", "stat"])
+RDM_LIMITER_QUEUE = Gauge("rdmass_rdm_limiter_queue", "RDM requests waiting for rate limiter", ["backend", "priority"])
+RDM_LIMITER_WAIT = Histogram(
+    "rdmass_rdm_limiter_wait_seconds", "Time RDM requests waited for rate limiter", ["backend", "priority"]
+)
+RDM_CIRCUIT_OPEN = Gauge("rdmass_rdm_circuit_open", "RDM circuit breaker open (1) or closed/half-open (0)", ["backend"])
+
+# scheduler
+SCHEDULER_JOB_LAG = Histogram(
+    "rdmass_scheduler_job_lag_seconds", "Delay between scheduled and actual job submission", ["job"]
+)
+SCHEDULER_JOB_MISSED = Counter("rdmass_scheduler_job_missed_total", "Jobs skipped by misfire handling", ["job"])
+SCHEDULER_JOB_ERRORS = Counter("rdmass_scheduler_job_errors_total", "Jobs raising an exception", ["job"])
+
+# event loop
+LOOP_LAG = Histogram(
+    "rdmass_event_loop_lag_seconds",
+    "Event loop scheduling delay",
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5),
+)
+LOOP_STALLS = Counter("rdmass_event_loop_stalls_total", "Event loop stalls above loop_monitor.threshold")
+
+# auto events & discord
+AUTO_EVENTS_DURATION = Histogram("rdmass_auto_events_duration_seconds", "Auto-event pipeline duration")
+FUNCTION_DURATION = Histogram("rdmass_function_duration_seconds", "Duration of timed functions", ["function"])
+DISCORD_REQUEST_DURATION = Histogram("rdmass_discord_request_duration_seconds", "Discord API call latency", ["call"])
+
+
+# job id -> job function, events only carry job id and date jobs are gone from jobstore by the time they're sent
+job_functions: "OrderedDict[Text, Text]" = OrderedDict()
+JOB_FUNCTIONS_SIZE = 1000
+
+
+def remember_job(job: Any) -> None:
+    job_functions[job.id] = job.func_ref.rpartition(":")[2]
+    job_functions.move_to_end(job.id)
+    while len(job_functions) > JOB_FUNCTIONS_SIZE:
+        job_functions.popitem(last=False)
+
+
+def scheduler_listener(scheduler: Any, event: Any) -> None:
+    from apscheduler.events import EVENT_JOB_ADDED, EVENT_JOB_ERROR, EVENT_JOB_MISSED, EVENT_JOB_SUBMITTED
+
+    # labels use job function instead of job id, ids are unique per job and would grow series without bound
+    if event.code == EVENT_JOB_ADDED:
+        job = scheduler.get_job(event.job_id, event.jobstore)
+        if job is not None:
+            remember_job(job)
+        return
+
+    job = job_functions.get(event.job_id, "unknown")
+    if event.code == EVENT_JOB_SUBMITTED:
+        now = datetime.now(timezone.utc)
+        for run_time in event.scheduled_run_times:
+            SCHEDULER_JOB_LAG.observe((now - run_time).total_seconds(), job=job)
+    elif event.code == EVENT_JOB_MISSED:
+        SCHEDULER_JOB_MISSED.inc(job=job)
+    elif event.code == EVENT_JOB_ERROR:
+        SCHEDULER_JOB_ERRORS.inc(job=job)
+
+
+def instrument_scheduler(scheduler: Any) -> None:
+    # scheduler has to be started (paused is enough), stopped one doesn't read its jobstore
+    from apscheduler.events import EVENT_JOB_ADDED, EVENT_JOB_ERROR, EVENT_JOB_MISSED, EVENT_JOB_SUBMITTED
+
+    for job in scheduler.get_jobs():
+        remember_job(job)
+
+    scheduler.add_listener(
+        lambda event: scheduler_listener(scheduler, event),
+        EVENT_JOB_ADDED | EVENT_JOB_SUBMITTED | EVENT_JOB_MISSED | EVENT_JOB_ERROR,
+    )
+
+
+_runner: Optional[object] = None
+
+
+async def start_server() -> None:
+    global _runner
+    from aiohttp import web
+
+    if _runner is not None:
+        return
+
+    async def handle_metrics(_: web.Request) -> web.Response:
+        return web.Response(
+            body=render().encode(), headers={"Content-Type": "text/plain; version=0.0.4; charset=utf-8"}
+        )
+
+    app = web.Application()
+    app.router.add_get("/metrics", handle_metrics)
+
+    _runner = web.AppRunner(app)
+    await _runner.setup()
+    await web.TCPSite(_runner, config.metrics.host, config.metrics.port).start()
+    log.info(f"metrics endpoint listening on http://{config.metrics.host}:{config.metrics.port}/metrics")
+
+
+async def stop_server() -> None:
+    global _runner
+
+    if _runner is not None:
+        await _runner.cleanup()
+        _runner = None
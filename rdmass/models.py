@@ -0,0 +1,96 @@
+import ijson
+from typing import Any, Dict, Iterable, Iterator, List, NamedTuple, Optional, Text, Tuple, Type, Union
+
+
+class Device(NamedTuple):
+    uuid: Text
+    instance: Optional[Text] = None
+    host: Optional[Text] = None
+    last_seen: Optional[float] = None
+
+    @property
+    def name(self) -> Text:
+        return self.uuid
+
+
+class Instance(NamedTuple):
+    name: Text
+    type: Optional[Text] = None
+    status: Any = None
+    count: Optional[int] = None
+
+
+class AssignmentGroup(NamedTuple):
+    name: Text
+    assignments: Text = ""
+
+
+class DeviceGroup(NamedTuple):
+    name: Text
+    devices: Tuple[Text, ...] = ()
+
+
+Record = Union[Device, Instance, AssignmentGroup, DeviceGroup]
+
+# get_data response key: record type, other sections are kept as decoded
+RECORDS: Dict[Text, Type[Record]] = {
+    "devices": Device,
+    "instances": Instance,
+    "assignmentgroups": AssignmentGroup,
+    "devicegroups": DeviceGroup,
+}
+
+
+def make_record(record_type: Type[Record], row: Dict) -> Record:
+    # only used fields are kept, rest of the row is dropped right away
+    values = [row.get(field) for field in record_type._fields]
+    if record_type is DeviceGroup:
+        values[1] = tuple(values[1] or ())
+    elif record_type is AssignmentGroup:
+        values[1] = values[1] or ""
+    return record_type(*values)
+
+
+class RecordIndex:
+    __slots__ = ("rows", "by_name")
+
+    def __init__(self, rows: Iterable[Record]) -> None:
+        self.rows = tuple(rows)
+        self.by_name = {row.name: row for row in self.rows}
+
+    def get(self, name: Text) -> Optional[Record]:
+        return self.by_name.get(name)
+
+    def __contains__(self, name: object) -> bool:
+        return name in self.by_name
+
+    def __iter__(self) -> Iterator[Record]:
+        return iter(self.rows)
+
+    def __len__(self) -> int:
+        return len(self.rows)
+
+    def __getitem__(self, index: int) -> Record:
+        return self.rows[index]
+
+    def __repr__(self) -> Text:
+        return f"<RecordIndex {len(self.rows)} rows>"
+
+
+def decode_section(key: Text, value: Any) -> Any:
+    record_type = RECORDS.get(key)
+    if record_type is None:
+        return value
+    return RecordIndex(make_record(record_type, row) for row in value or ())
+
+
+def decode_data(content: bytes, keys: List[Text]) -> Optional[Dict[Text, Any]]:
+    # devices, instances and groups become RecordIndex of compact records, None unless response status is ok
+    # single pass over the data object, sections nobody asked for are skipped
+    wanted = set(keys)
+    data = {key: value for key, value in ijson.kvitems(content, "data", use_float=True) if key in wanted}
+
+    # error responses carry no data, so status needs another pass only when nothing was found
+    if not data and next(ijson.items(content, "status"), None) != "ok":
+        return None
+    return {key: decode_section(key, data.get(key)) for key in keys}
@@ -0,0 +1,129 @@
+import asyncio
+import discord
+from sentry_sdk import capture_exception
+from typing import Dict, List, Optional, Text
+
+from rdmass.config import config, logging
+from rdmass.metrics import DISCORD_REQUEST_DURATION
+
+log = logging.getLogger(__name__)
+
+MESSAGE_LIMIT = 2000
+
+
+def split_message(content: Text, limit: int = MESSAGE_LIMIT) -> List[Text]:
+    chunks = []
+    chunk = ""
+
+    for line in content.splitlines(keepends=True):
+        # single line above limit has to be hard split
+        while len(line) > limit:
+            if chunk:
+                chunks.append(chunk)
+                chunk = ""
+            chunks.append(line[:limit])
+            line = line[limit:]
+
+        if len(chunk) + len(line) > limit:
+            chunks.append(chunk)
+            chunk = ""
+        chunk += line
+
+    if chunk.strip():
+        chunks.append(chunk)
+
+    return chunks
+
+
+class Notifier:
+    def __init__(self, client: discord.Client, window: float, retries: int) -> None:
+        self.client = client
+        self.window = window
+        self.retries = retries
+        self._channels: Dict[int, discord.abc.Messageable] = {}
+        self._queues: Dict[int, asyncio.Queue] = {}
+        self._workers: Dict[int, asyncio.Task] = {}
+
+    async def get_channel(self, channel_id: int) -> discord.abc.Messageable:
+        channel = self._channels.get(channel_id) or self.client.get_channel(channel_id)
+        if channel is None:
+            with DISCORD_REQUEST_DURATION.time(call="fetch_channel"):
+                channel = await self.client.fetch_channel(channel_id)
+
+        self._channels[channel_id] = channel
+        return channel
+
+    def send(self, channel_id: Optional[int], content: Text) -> None:
+        # never blocks the caller, messages are delivered by per-channel worker
+        if not channel_id or not content:
+            return
+
+        if channel_id not in self._queues:
+            self._queues[channel_id] = asyncio.Queue()
+            self._workers[channel_id] = asyncio.ensure_future(self.worker(channel_id))
+
+        self._queues[channel_id].put_nowait(content)
+
+    async def worker(self, channel_id: int) -> None:
+        queue = self._queues[channel_id]
+        loop = asyncio.get_event_loop()
+
+        while True:
+            messages = [await queue.get()]
+
+            # merge messages arriving within coalesce window into one post
+            deadline = loop.time() + self.window
+            while deadline > loop.time():
+                try:
+                    messages.append(await asyncio.wait_for(queue.get(), deadline - loop.time()))
+                except asyncio.TimeoutError:
+                    break
+
+            try:
+                for chunk in split_message("\n".join(message.rstrip("\n") for message in messages)):
+                    await self.deliver(channel_id, chunk)
+            except Exception as e:
+                # keep worker alive whatever happens to a single post
+                capture_exception(e)
+                log.exception(f"Notifier - delivery to channel {channel_id} failed")
+            finally:
+                for _ in messages:
+                    queue.task_done()
+
+    async def deliver(self, channel_id: int, content: Text) -> None:
+        for attempt in range(self.retries + 1):
+            try:
+                channel = await self.get_channel(channel_id)
+                with DISCORD_REQUEST_DURATION.time(call="send"):
+                    await channel.send(content)
+                return
+            except (discord.NotFound, discord.Forbidden) as e:
+                self._channels.pop(channel_id, None)
+                log.error(f"Notifier - channel {channel_id} unavailable: {e}")
+                return
+            except discord.HTTPException as e:
+                # discord.py already waits out rate limit buckets, this covers exhausted retries and 5xx
+                if e.status != 429 and e.status < 500:
+                    log.error(f"Notifier - send to {channel_id} rejected: {e}")
+                    return
+
+                log.warning(f"Notifier - send to {channel_id} failed ({e.status}), attempt {attempt + 1}")
+                await asyncio.sleep(2**attempt)
+
+        log.error(f"Notifier - dropped message to channel {channel_id}")
+
+    async def close(self, timeout: float = 5) -> None:
+        try:
+            await asyncio.wait_for(asyncio.gather(*[queue.join() for queue in self._queues.values()]), timeout)
+        except asyncio.TimeoutError:
+            log.warning("Notifier - closed with undelivered messages")
+
+        for worker in self._workers.values():
+            worker.cancel()
+
+        self._queues.clear()
+        self._workers.clear()
+
+
+def create_notifier(client: discord.Client) -> Notifier:
+    return Notifier(client, window=config.bot.notify_coalesce_window, retries=config.bot.notify_retries)
@@ -0,0 +1,111 @@
+import arrow
+from dataclasses import dataclass, field
+from typing import Dict, Iterable, List, Mapping, Optional, Sequence, Set, Text
+
+# pure auto-event planning, kept free of config, I/O and discord imports so it can be benchmarked offline
+
+
+@dataclass
+class Event:
+    name: str
+    type: str
+    has_quests: bool
+    beginning: bool = False
+    accepted_hours: bool = False
+    accepted_diff: bool = False
+    date: Optional[str] = None
+    date_arrow: Optional[arrow.arrow.Arrow] = None
+
+
+@dataclass
+class PlannerSettings:
+    types: Sequence[Text]
+    time_range: Sequence[int]
+    skip_diff: float
+    timezone: Text
+
+
+@dataclass
+class EventPlan:
+    events: List[Event] = field(default_factory=list)
+    filtered_events: List[Event] = field(default_factory=list)
+
+
+def feed_dates(raw_events: Iterable[Dict], settings: PlannerSettings) -> List[Text]:
+    types = frozenset(settings.types)
+    return [
+        event_row[event_type]
+        for event_row in raw_events
+        if event_row["type"] in types
+        for event_type in ("start", "end")
+        if event_row[event_type]
+    ]
+
+
+def plan_events(
+    raw_events: Iterable[Dict],
+    past_event_dates: Mapping[Text, Set[Text]],
+    settings: PlannerSettings,
+    now: arrow.Arrow,
+) -> EventPlan:
+    types = frozenset(settings.types)
+    hour_from, hour_to = settings.time_range
+    past_main = past_event_dates["main"]
+    past_all = past_event_dates["filtered"] | past_main
+
+    events = []
+    filtered_events = []
+    beginning_dates = set()
+    beginning_dates_filtered = set()
+    # many events share the same start/end date - parse each date once
+    parsed_dates: Dict[Text, arrow.Arrow] = {}
+
+    # iterate all events in source and created 2 events (starting and ending) for each event
+    for event_row in raw_events:
+        # include only selected event types
+        if event_row["type"] not in types:
+            continue
+
+        # process both start and the end of the event
+        for event_type in ("start", "end"):
+            date = event_row[event_type]
+            if not date:
+                continue
+
+            date_arrow = parsed_dates.get(date)
+            if date_arrow is None:
+                date_arrow = parsed_dates[date] = arrow.get(date, tzinfo=settings.timezone)
+
+            event = Event(
+                name=event_row["name"],
+                type=event_row["type"],
+                has_quests=event_row["has_quests"],
+                beginning=event_type == "start",
+                accepted_hours=hour_from <= date_arrow.hour <= hour_to,
+                accepted_diff=(date_arrow - now).total_seconds() > settings.skip_diff,
+                date=date,
+                date_arrow=date_arrow,
+            )
+
+            if event.has_quests and event.accepted_hours and event.accepted_diff:
+                if event.beginning:
+                    beginning_dates.add(date)
+                events.append(event)
+            else:
+                if event.beginning:
+                    beginning_dates_filtered.add(date)
+                filtered_events.append(event)
+
+    # use end events only when there's no beginning event with same date
+    return EventPlan(
+        events=[
+            event
+            for event in events
+            if event.date not in past_main and (event.beginning or event.date not in beginning_dates)
+        ],
+        filtered_events=[
+            event
+            for event in filtered_events
+            if event.date not in past_all and (event.beginning or event.date not in beginning_dates_filtered)
+        ],
+    )
@@ -0,0 +1,165 @@
+import asyncio
+import functools
+import inspect
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from dataclasses import dataclass, field
+from types import FrameType
+from typing import Any, Callable, Dict, List, Optional, Text, TypeVar, cast
+
+from rdmass.config import config, logging
+from rdmass.metrics import FUNCTION_DURATION
+
+log = logging.getLogger(__name__)
+
+F = TypeVar("F", bound=Callable[..., Any])
+
+package_path = os.path.dirname(__file__)
+
+
+def record_timing(name: Text, elapsed: float) -> None:
+    FUNCTION_DURATION.observe(elapsed, function=name)
+
+    report = profiler.report
+    if report is not None:
+        row = report.timings.setdefault(name, [0, 0.0, 0.0])
+        row[0] += 1
+        row[1] += elapsed
+        row[2] = max(row[2], elapsed)
+
+    log.debug(f"{name} took {elapsed:.3f}s")
+
+
+def timeit(func: F) -> F:
+    name = f"{func.__module__}.{func.__qualname__}"
+
+    # coroutine is timed until awaited result, time spent suspended included
+    if inspect.iscoroutinefunction(func):
+
+        @functools.wraps(func)
+        async def async_wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return await func(*args, **kwargs)
+            finally:
+                record_timing(name, time.perf_counter() - start)
+
+        return cast(F, async_wrapper)
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            record_timing(name, time.perf_counter() - start)
+
+    return cast(F, wrapper)
+
+
+def call_site(frame: FrameType) -> Text:
+    return f"{os.path.relpath(frame.f_code.co_filename)}:{frame.f_lineno} {frame.f_code.co_name}"
+
+
+def own_frame(frame: Optional[FrameType]) -> Optional[FrameType]:
+    # innermost frame of our own code tells which handler is burning the loop, timeit wrappers skipped
+    while frame is not None and (
+        not frame.f_code.co_filename.startswith(package_path) or frame.f_code.co_filename == __file__
+    ):
+        frame = frame.f_back
+    return frame
+
+
+def is_idle(frame: FrameType) -> bool:
+    # event loop waiting for IO sits in selectors module
+    return frame.f_code.co_filename.endswith("selectors.py")
+
+
+@dataclass
+class ProfileReport:
+    duration: float
+    samples: int = 0
+    idle: int = 0
+    leaves: Counter = field(default_factory=Counter)
+    own: Counter = field(default_factory=Counter)
+    # function name -> [calls, total seconds, max seconds]
+    timings: Dict[Text, List[float]] = field(default_factory=dict)
+
+    @property
+    def busy(self) -> int:
+        return self.samples - self.idle
+
+    def format(self, top: int) -> Text:
+        busy_ratio = self.busy / (self.samples or 1) * 100
+        lines = [f"**[Profiler]** {self.duration:g}s, {self.samples} samples, event loop busy {busy_ratio:.1f}%"]
+
+        slowest = sorted(self.timings.items(), key=lambda row: row[1][1], reverse=True)[:top]
+        if slowest:
+            lines.append("Slowest coroutines (calls, total, max):")
+            lines += [f"`{name}` {calls}x, {total:.3f}s, {maximum:.3f}s" for name, (calls, total, maximum) in slowest]
+
+        for title, counter in (("Top RDMAss call sites", self.own), ("Top call sites", self.leaves)):
+            if counter:
+                lines.append(f"{title} (busy samples):")
+                lines += [f"`{site}` {count / (self.busy or 1) * 100:.1f}%" for site, count in counter.most_common(top)]
+
+        return "\n".join(lines)
+
+
+class SamplingProfiler:
+    def __init__(self, interval: float) -> None:
+        self.interval = interval
+        self.report: Optional[ProfileReport] = None
+        self._stop = threading.Event()
+
+    @property
+    def running(self) -> bool:
+        return self.report is not None
+
+    def sample(self, thread_id: int) -> None:
+        report = self.report
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(thread_id)
+            if frame is None:
+                continue
+
+            report.samples += 1
+            if is_idle(frame):
+                report.idle += 1
+                continue
+
+            report.leaves[call_site(frame)] += 1
+            frame = own_frame(frame)
+            if frame is not None:
+                report.own[call_site(frame)] += 1
+
+    async def profile(self, seconds: float) -> ProfileReport:
+        if self.running:
+            raise RuntimeError("profiler is already running")
+
+        self.report = ProfileReport(duration=seconds)
+        self._stop.clear()
+
+        # sampler thread peeks at the event loop thread stack
+        thread = threading.Thread(
+            target=self.sample,
+            args=(threading.get_ident(),),
+            name="rdmass-profiler",
+            daemon=True,
+        )
+        thread.start()
+
+        try:
+            await asyncio.sleep(seconds)
+        finally:
+            self._stop.set()
+            thread.join()
+            report, self.report = self.report, None
+
+        return report
+
+
+profiler = SamplingProfiler(interval=config.profiler.interval)
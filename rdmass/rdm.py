@@ -1,123 +1,450 @@
+import asyncio
+import copy
 import httpx
-from typing import Dict, List, Optional, Text
+from dataclasses import dataclass
+from dotted_dict import DottedDict
+from typing import Any, Awaitable, Callable, Dict, Optional, Text, Tuple, TypeVar
 
-from rdmass.config import config, logging
+from rdmass.cache import MISSING, SingleFlight, TTLCache
+from rdmass.config import config, deep_update, logging
+from rdmass.eventloop import run_blocking
+from rdmass.metrics import (
+    RDM_CACHE,
+    RDM_CIRCUIT_OPEN,
+    RDM_COALESCE,
+    RDM_LIMITER_QUEUE,
+    RDM_LIMITER_WAIT,
+    RDM_REQUEST_DURATION,
+    RDM_REQUEST_ERRORS,
+    collectors,
+)
+from rdmass.models import RecordIndex, decode_data
+from rdmass.profiling import timeit
+from rdmass.resilience import (
+    BACKGROUND,
+    CircuitBreaker,
+    PriorityLimiter,
+    backoff_delay,
+    request_priority,
+    with_priority,
+)
 
 log = logging.getLogger(__name__)
 
+T = TypeVar("T")
 
-async def client_get(url: Text, params: Dict) -> httpx.Response:
-    async with httpx.AsyncClient(timeout=config.instance.rdm.http_timeout) as client:
-        response = await client.get(
-            url,
-            auth=(config.instance.rdm.username, config.instance.rdm.password),
+RETRY_STATUS_CODES = {httpx.codes.BAD_GATEWAY, httpx.codes.SERVICE_UNAVAILABLE, httpx.codes.GATEWAY_TIMEOUT}
+
+
+class RDMBackend:
+    def __init__(self, name: Text, settings: DottedDict) -> None:
+        self.name = name
+        self.settings = settings
+        self.breaker = CircuitBreaker(
+            failure_threshold=settings.circuit_breaker.failure_threshold,
+            reset_timeout=settings.circuit_breaker.reset_timeout,
+        )
+        self.limiter = PriorityLimiter(
+            rate=settings.rate_limit.rate, burst=settings.rate_limit.burst, enabled=settings.rate_limit.enabled
+        )
+        self.cache = TTLCache(max_size=settings.cache.max_size, enabled=settings.cache.enabled)
+        self.inflight = SingleFlight()
+        self.http_client: Optional[httpx.AsyncClient] = None
+
+    def create_client(self) -> httpx.AsyncClient:
+        pool = self.settings.http_pool
+        http2 = pool.http2
+
+        # http2 needs optional h2 package (httpx[http2])
+        if http2:
+            try:
+                import h2  # noqa: F401
+            except ImportError:
+                log.warning("http_pool.http2 enabled but h2 package is missing - falling back to HTTP/1.1")
+                http2 = False
+
+        return httpx.AsyncClient(
+            auth=(self.settings.username, self.settings.password),
             headers={"user-agent": config.bot.user_agent},
-            params=params,
+            timeout=self.settings.http_timeout,
+            limits=httpx.Limits(
+                max_connections=pool.max_connections,
+                max_keepalive_connections=pool.max_keepalive_connections,
+                keepalive_expiry=pool.keepalive_expiry,
+            ),
+            http2=http2,
         )
-        log.info(f"httpx GET {str(response.url).replace(config.instance.rdm.api_endpoint, '')}")
 
-        return response
+    async def open_client(self) -> httpx.AsyncClient:
+        if self.http_client is None or self.http_client.is_closed:
+            self.http_client = self.create_client()
+            log.debug(f"RDM [{self.name}] http client opened")
+
+        return self.http_client
+
+    async def close_client(self) -> None:
+        if self.http_client is not None and not self.http_client.is_closed:
+            await self.http_client.aclose()
+            log.debug(f"RDM [{self.name}] http client closed")
+
+        self.http_client = None
+
+    async def client_get(self, path: Text, params: Dict, idempotent: bool = True) -> httpx.Response:
+        client = await self.open_client()
+        retry = self.settings.retry
+        attempt = 0
+
+        # breaker counts logical requests, retries of one call end in a single success or failure
+        probe = self.breaker.before_request()
+        try:
+            while True:
+                waited = await self.limiter.acquire()
+                if waited:
+                    RDM_LIMITER_WAIT.observe(waited, backend=self.name, priority=request_priority.get())
+
+                try:
+                    with RDM_REQUEST_DURATION.time(backend=self.name, endpoint=path):
+                        response = await client.get(self.settings.api_endpoint + path, params=params)
+                except httpx.RequestError as e:
+                    RDM_REQUEST_ERRORS.inc(backend=self.name, endpoint=path, error=type(e).__name__)
+
+                    # non idempotent calls are retried only when request never reached RDM
+                    retryable = idempotent or isinstance(e, (httpx.ConnectError, httpx.ConnectTimeout))
+                    if not retryable or attempt >= retry.retries:
+                        self.breaker.record_failure()
+                        raise
+
+                    log.warning(
+                        f"httpx GET [{self.name}] failed ({type(e).__name__}: {e}), "
+                        f"retry {attempt + 1}/{retry.retries}"
+                    )
+                else:
+                    if response.status_code not in RETRY_STATUS_CODES:
+                        self.breaker.record_success()
+                        log.info(f"httpx GET [{self.name}] {str(response.url).replace(self.settings.api_endpoint, '')}")
+                        return response
+
+                    RDM_REQUEST_ERRORS.inc(backend=self.name, endpoint=path, error=response.status_code)
+                    if not idempotent or attempt >= retry.retries:
+                        self.breaker.record_failure()
+                        return response
+
+                    log.warning(
+                        f"httpx GET [{self.name}] got {response.status_code}, retry {attempt + 1}/{retry.retries}"
+                    )
+
+                await asyncio.sleep(backoff_delay(attempt, retry.backoff_base, retry.backoff_max))
+                attempt += 1
+        finally:
+            if probe:
+                self.breaker.end_probe()
+
+    async def fetch_data(self, params: Dict) -> Optional[Dict]:
+        response = await self.client_get("/api/get_data", params)
+        if response.status_code != httpx.codes.OK:
+            return None
+
+        # only requested sections are decoded, off the loop as big instance lists take a while
+        keys = [key for flag, key in SNAPSHOT_SECTIONS.values() if params.get(flag)]
+        return await run_blocking(decode_data, response.content, keys)
+
+    @timeit
+    async def get_request(self, params: Dict) -> Optional[Dict]:
+        if not self.settings.coalesce_requests:
+            return await self.fetch_data(params)
+
+        # identical concurrent reads share one in-flight request, per priority so urgent callers never
+        # wait behind a background request in the limiter queue
+        key = (request_priority.get(), tuple(sorted(params.items())))
+        return await self.inflight.do(key, lambda: self.fetch_data(params))
+
+    @timeit
+    async def set_request(self, params: Dict, invalidates: Tuple[Text, ...] = ()) -> bool:
+        try:
+            response = await self.client_get("/api/set_data", params, idempotent=False)
+        finally:
+            # state might have changed even when request failed midway
+            self.cache.invalidate(*invalidates)
+            flags = {SNAPSHOT_SECTIONS[section][0] for section in invalidates}
+            self.inflight.discard(lambda key: any(flag in flags and value for flag, value in key[1]))
+
+        log.debug(f"set_request [{self.name}] response code: {response.status_code}")
+        return response.status_code == httpx.codes.OK
+
+    def get_cached_section(self, section: Text, skip_status: bool) -> Any:
+        if section != "instances":
+            return self.cache.get((section,))
+
+        # instances with status are a superset of instances without it
+        cached = self.cache.get((section, False))
+        if cached is MISSING and skip_status:
+            cached = self.cache.get((section, True))
+        return cached
+
+
+def load_backends() -> Dict[Text, RDMBackend]:
+    # first backend comes from instance.rdm, others inherit its settings
+    default_settings = dict(config.instance.rdm)
+    output = {
+        default_settings.get("name", "default"): RDMBackend(
+            default_settings.get("name", "default"), config.instance.rdm
+        )
+    }
+
+    for row in config.instance.get("rdm_backends", []):
+        settings = DottedDict(deep_update(copy.deepcopy(default_settings), row))
+        output[settings.name] = RDMBackend(settings.name, settings)
+
+    return output
+
+
+backends = load_backends()
+default_backend = next(iter(backends))
 
 
-async def get_request(params: Dict) -> Optional[Dict]:
-    response = await client_get(config.instance.rdm.api_endpoint + "/api/get_data", params)
-    if response.status_code == httpx.codes.OK and response.json().get("status") == "ok":
-        return response.json()
+def get_backend(name: Optional[Text] = None) -> RDMBackend:
+    return backends[name or default_backend]
 
 
-async def set_request(params: Dict) -> bool:
-    response = await client_get(config.instance.rdm.api_endpoint + "/api/set_data", params)
-    log.debug(f"set_request response code: {response.status_code}")
-    return response.status_code == httpx.codes.OK
+def split_target(target: Text) -> Tuple[Text, Text]:
+    # "backend:name" targets a specific backend, plain names use the default one
+    backend, _, name = target.partition(":")
+    if name and backend in backends:
+        return backend, name
+    return default_backend, target
+
+
+def qualify(backend: Text, name: Text) -> Text:
+    return name if backend == default_backend else f"{backend}:{name}"
+
+
+async def gather_backends(
+    call: Callable[[Text], Awaitable[T]], errors: Optional[Dict[Text, httpx.RequestError]] = None
+) -> Dict[Text, Optional[T]]:
+    # failed backends map to None, their request errors are collected into `errors` when given
+    names = list(backends)
+    results = await asyncio.gather(*[call(name) for name in names], return_exceptions=True)
+    output = {}
+
+    for name, result in zip(names, results):
+        if isinstance(result, httpx.RequestError):
+            log.warning(f"RDM [{name}] request failed: {type(result).__name__}: {result}")
+            if errors is not None:
+                errors[name] = result
+            result = None
+        elif isinstance(result, BaseException):
+            raise result
+        output[name] = result
+
+    return output
+
+
+def collect_metrics() -> None:
+    for name, backend in backends.items():
+        for stat, value in backend.cache.stats().items():
+            RDM_CACHE.set(value, backend=name, stat=stat)
+        for stat, value in backend.inflight.stats().items():
+            RDM_COALESCE.set(value, backend=name, stat=stat)
+        for priority, depth in backend.limiter.depth().items():
+            RDM_LIMITER_QUEUE.set(depth, backend=name, priority=priority)
+        RDM_CIRCUIT_OPEN.set(int(backend.breaker.state == backend.breaker.OPEN), backend=name)
+
+
+collectors.append(collect_metrics)
+
+
+async def open_client() -> None:
+    for backend in backends.values():
+        await backend.open_client()
+
+
+async def close_client() -> None:
+    for backend in backends.values():
+        await backend.close_client()
+
+
+@dataclass
+class Snapshot:
+    devices: Optional[RecordIndex] = None
+    instances: Optional[RecordIndex] = None
+    assignment_groups: Optional[RecordIndex] = None
+    device_groups: Optional[RecordIndex] = None
+    status: Optional[Dict] = None
+
+
+# snapshot section: (get_data flag, response key)
+SNAPSHOT_SECTIONS = {
+    "devices": ("show_devices", "devices"),
+    "instances": ("show_instances", "instances"),
+    "assignment_groups": ("show_assignmentgroups", "assignmentgroups"),
+    "device_groups": ("show_devicegroups", "devicegroups"),
+    "status": ("show_status", "status"),
+}
 
 
 class RDMGetApi:
     @classmethod
-    async def get_devices(cls) -> Optional[List[Dict]]:
-        params = {"show_devices": True}
+    @timeit
+    async def snapshot(
+        cls,
+        devices: bool = False,
+        instances: bool = False,
+        assignment_groups: bool = False,
+        device_groups: bool = False,
+        status: bool = False,
+        skip_status: bool = True,
+        backend: Optional[Text] = None,
+    ) -> Optional[Snapshot]:
+        rdm = get_backend(backend)
+        requested = {
+            "devices": devices,
+            "instances": instances,
+            "assignment_groups": assignment_groups,
+            "device_groups": device_groups,
+            "status": status,
+        }
+        snapshot = Snapshot()
+        params = {}
+
+        # reuse recently fetched sections, request only missing ones
+        for section in [section for section, wanted in requested.items() if wanted]:
+            cached = rdm.get_cached_section(section, skip_status)
+            if cached is not MISSING:
+                setattr(snapshot, section, cached)
+            else:
+                params[SNAPSHOT_SECTIONS[section][0]] = True
+
+        if not params:
+            return snapshot
+
+        if "show_instances" in params:
+            params["skip_instance_status"] = skip_status
+
+        generations = {section: rdm.cache.generation(section) for section in SNAPSHOT_SECTIONS}
+        output = await rdm.get_request(params)
+        if not output:
+            return None
+        sizes = {key: len(value or ()) for key, value in output.items()}
+        log.debug(f"RDMGetApi.snapshot [{rdm.name}]: {sizes}")
+
+        for section, (flag, key) in SNAPSHOT_SECTIONS.items():
+            if flag not in params:
+                continue
+
+            value = output[key]
+            setattr(snapshot, section, value)
+            # section was written meanwhile, response might predate the write
+            if rdm.cache.generation(section) != generations[section]:
+                continue
+            rdm.cache.set(
+                (section, skip_status) if section == "instances" else (section,),
+                value,
+                rdm.settings.cache.ttl[section],
+            )
+
+        return snapshot
+
+    @classmethod
+    async def get_devices(cls, backend: Optional[Text] = None) -> Optional[RecordIndex]:
+        snapshot = await cls.snapshot(devices=True, backend=backend)
+        if snapshot:
+            return snapshot.devices
 
-        output = await get_request(params)
-        log.debug(f"RDMGetApi.get_devices: {output}")
-        if output:
-            return output["data"]["devices"]
+    @classmethod
+    async def get_instances(cls, skip_status: bool = True, backend: Optional[Text] = None) -> Optional[RecordIndex]:
+        snapshot = await cls.snapshot(instances=True, skip_status=skip_status, backend=backend)
+        if snapshot:
+            return snapshot.instances
 
     @classmethod
-    async def get_instances(cls, skip_status: bool = True) -> Optional[List[Dict]]:
-        params = {"show_instances": True, "skip_instance_status": skip_status}
+    async def get_assignment_groups(cls, backend: Optional[Text] = None) -> Optional[RecordIndex]:
+        snapshot = await cls.snapshot(assignment_groups=True, backend=backend)
+        if snapshot:
+            return snapshot.assignment_groups
 
-        output = await get_request(params)
-        log.debug(f"RDMGetApi.get_instances: {output}")
-        if output:
-            return output["data"]["instances"]
+    @classmethod
+    async def get_device_groups(cls, backend: Optional[Text] = None) -> Optional[RecordIndex]:
+        snapshot = await cls.snapshot(device_groups=True, backend=backend)
+        if snapshot:
+            return snapshot.device_groups
 
     @classmethod
-    async def get_assignment_groups(cls) -> Optional[List[Dict]]:
-        params = {"show_assignmentgroups": True}
+    async def get_status(cls, backend: Optional[Text] = None) -> Optional[Dict]:
+        snapshot = await cls.snapshot(status=True, backend=backend)
+        if snapshot:
+            return snapshot.status
 
-        output = await get_request(params)
-        log.debug(f"RDMGetApi.get_assignment_groups: {output}")
-        if output:
-            return output["data"]["assignmentgroups"]
+    @classmethod
+    async def get_status_all(
+        cls, errors: Optional[Dict[Text, httpx.RequestError]] = None
+    ) -> Dict[Text, Optional[Dict]]:
+        return await gather_backends(lambda name: cls.get_status(backend=name), errors)
 
     @classmethod
-    async def get_status(cls) -> Optional[Dict]:
-        params = {"show_status": True}
+    @timeit
+    @with_priority(BACKGROUND)
+    async def warm_cache(cls) -> None:
+        await gather_backends(
+            lambda name: cls.snapshot(devices=True, instances=True, assignment_groups=True, status=True, backend=name)
+        )
+        log.debug(f"RDMGetApi.warm_cache done: {cls.cache_stats()}")
 
-        output = await get_request(params)
-        log.debug(f"RDMGetApi.get_status: {output}")
-        if output:
-            return output["data"]["status"]
+    @classmethod
+    def cache_stats(cls) -> Dict[Text, Dict[Text, int]]:
+        return {name: backend.cache.stats() for name, backend in backends.items()}
 
 
 class RDMSetApi:
     @classmethod
-    async def assign_device(cls, device_name: Text, instance_name: Text) -> bool:
+    async def assign_device(cls, device_name: Text, instance_name: Text, backend: Optional[Text] = None) -> bool:
         params = {
             "assign_device": True,
             "device_name": device_name,
             "instance": instance_name,
         }
 
-        output = await set_request(params)
+        output = await get_backend(backend).set_request(params, invalidates=("devices", "instances"))
         log.debug(f"RDMSetApi.assign_device: {output}")
         return output
 
     @classmethod
-    async def assign_device_group(cls, device_group_name: Text, instance_name: Text) -> bool:
+    async def assign_device_group(
+        cls, device_group_name: Text, instance_name: Text, backend: Optional[Text] = None
+    ) -> bool:
         params = {
             "assign_device_group": True,
             "device_group_name": device_group_name,
             "instance": instance_name,
         }
 
-        output = await set_request(params)
+        output = await get_backend(backend).set_request(params, invalidates=("devices", "instances"))
         log.debug(f"RDMSetApi.assign_device_group: {output}")
         return output
 
     @classmethod
-    async def assignment_group(cls, name: Text, re_quest: bool = False) -> bool:
+    async def assignment_group(cls, name: Text, re_quest: bool = False, backend: Optional[Text] = None) -> bool:
         params = {
             "assignmentgroup_name": name,
             "assignmentgroup_re_quest": re_quest,
             "assignmentgroup_start": not re_quest,
         }
 
-        output = await set_request(params)
+        output = await get_backend(backend).set_request(params, invalidates=("devices", "instances", "status"))
         log.debug(f"RDMSetApi.assignment_group: {output}")
         return output
 
     @classmethod
-    async def reload_instances(cls) -> bool:
+    async def reload_instances(cls, backend: Optional[Text] = None) -> bool:
         params = {"reload_instances": True}
 
-        output = await set_request(params)
+        output = await get_backend(backend).set_request(params, invalidates=("devices", "instances", "status"))
         log.debug(f"RDMSetApi.reload_instances: {output}")
         return output
 
     @classmethod
-    async def clear_all_quests(cls) -> bool:
+    async def clear_all_quests(cls, backend: Optional[Text] = None) -> bool:
         params = {"clear_all_quests": True}
 
-        output = await set_request(params)
+        output = await get_backend(backend).set_request(params, invalidates=("instances", "status"))
         log.debug(f"RDMSetApi.clear_all_quests: {output}")
         return output
@@ -0,0 +1,173 @@
+import asyncio
+import functools
+import heapq
+import httpx
+import itertools
+import random
+import time
+from contextvars import ContextVar
+from typing import Any, Callable, Dict, List, Optional, Text, Tuple, TypeVar, cast
+
+F = TypeVar("F", bound=Callable[..., Any])
+
+# lower index goes first when RDM requests have to queue
+SCHEDULED = "scheduled"
+INTERACTIVE = "interactive"
+BACKGROUND = "background"
+PRIORITIES = (SCHEDULED, INTERACTIVE, BACKGROUND)
+
+# inherited by tasks spawned from the handler, so gathered requests keep caller priority
+request_priority: ContextVar[Text] = ContextVar("request_priority", default=INTERACTIVE)
+
+
+class CircuitOpenError(httpx.RequestError):
+    pass
+
+
+class CircuitBreaker:
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half-open"
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30) -> None:
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self._opened_at = None
+        self._probing = False
+
+    @property
+    def state(self) -> Text:
+        if self._opened_at is None:
+            return self.CLOSED
+        if time.monotonic() - self._opened_at >= self.reset_timeout:
+            return self.HALF_OPEN
+        return self.OPEN
+
+    @property
+    def retry_in(self) -> float:
+        if self._opened_at is None:
+            return 0
+        return max(0.0, self.reset_timeout - (time.monotonic() - self._opened_at))
+
+    def before_request(self) -> bool:
+        # returns True for the single trial request let through in half-open state
+        state = self.state
+        if state == self.OPEN:
+            raise CircuitOpenError(f"RDM unavailable, circuit open (retry in {self.retry_in:.0f}s)")
+        if state == self.HALF_OPEN:
+            if self._probing:
+                raise CircuitOpenError("RDM unavailable, circuit half-open (trial request in progress)")
+            self._probing = True
+            return True
+        return False
+
+    def end_probe(self) -> None:
+        # called once trial request is done, also when it was cancelled without outcome
+        self._probing = False
+
+    def record_success(self) -> None:
+        self.failures = 0
+        self._opened_at = None
+
+    def record_failure(self) -> None:
+        self.failures += 1
+
+        # single failed trial in half-open state re-opens the circuit
+        if self.state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+            self._opened_at = time.monotonic()
+
+    def describe(self) -> Text:
+        state = self.state
+        if state == self.OPEN:
+            return f"{state} (retry in {self.retry_in:.0f}s)"
+        return f"{state} ({self.failures} failures)"
+
+
+def backoff_delay(attempt: int, base: float, maximum: float) -> float:
+    # exponential backoff with full jitter
+    return random.uniform(0, min(maximum, base * 2**attempt))
+
+
+def with_priority(priority: Text) -> Callable[[F], F]:
+    def decorator(func: F) -> F:
+        @functools.wraps(func)
+        async def wrapper(*args, **kwargs):
+            token = request_priority.set(priority)
+            try:
+                return await func(*args, **kwargs)
+            finally:
+                request_priority.reset(token)
+
+        return cast(F, wrapper)
+
+    return decorator
+
+
+class PriorityLimiter:
+    # token bucket, callers without free token queue by priority then arrival
+    def __init__(self, rate: float, burst: int, enabled: bool = True) -> None:
+        if enabled and (rate <= 0 or burst < 1):
+            raise ValueError("rate_limit.rate must be above 0 and rate_limit.burst at least 1")
+
+        self.rate = rate
+        self.burst = burst
+        self.enabled = enabled
+        self.tokens = float(burst)
+        self._updated = time.monotonic()
+        self._waiters: List[Tuple[int, int, asyncio.Future, Text]] = []
+        self._sequence = itertools.count()
+        self._pump: Optional[asyncio.Task] = None
+
+    def refill(self) -> None:
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def depth(self) -> Dict[Text, int]:
+        output = {priority: 0 for priority in PRIORITIES}
+        for _, _, future, priority in self._waiters:
+            if not future.done():
+                output[priority] += 1
+        return output
+
+    def describe(self) -> Text:
+        return "queue " + ", ".join(f"{priority} {count}" for priority, count in self.depth().items())
+
+    async def acquire(self, priority: Optional[Text] = None) -> float:
+        if not self.enabled:
+            return 0.0
+
+        self.refill()
+        if not self._waiters and self.tokens >= 1:
+            self.tokens -= 1
+            return 0.0
+
+        priority = priority or request_priority.get()
+        future = asyncio.get_event_loop().create_future()
+        heapq.heappush(self._waiters, (PRIORITIES.index(priority), next(self._sequence), future, priority))
+        if self._pump is None or self._pump.done():
+            self._pump = asyncio.ensure_future(self.pump())
+
+        start = time.monotonic()
+        try:
+            await future
+        except asyncio.CancelledError:
+            # token was already handed over, give it back
+            if future.done() and not future.cancelled():
+                self.tokens = min(self.burst, self.tokens + 1)
+            raise
+        return time.monotonic() - start
+
+    async def pump(self) -> None:
+        while self._waiters:
+            self.refill()
+            if self.tokens < 1:
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+                continue
+
+            _, _, future, _ = heapq.heappop(self._waiters)
+            # cancelled waiters don't consume tokens
+            if not future.done():
+                self.tokens -= 1
+                future.set_result(None)
@@ -0,0 +1,113 @@
+import asyncio
+import httpx
+import time
+from collections import deque
+from dataclasses import dataclass, field
+from sentry_sdk import capture_exception
+from typing import Callable, Deque, Dict, List, Optional, Text
+
+from rdmass.config import config, logging
+from rdmass.rdm import RDMGetApi
+from rdmass.resilience import BACKGROUND, with_priority
+
+log = logging.getLogger(__name__)
+
+
+@dataclass
+class StatusSample:
+    timestamp: float
+    status: Dict
+    backends: Dict[Text, Optional[Dict]] = field(default_factory=dict)
+
+
+def aggregate_status(statuses: List[Dict]) -> Dict:
+    # sum numeric leaves of status dicts from every backend
+    output = {}
+    for status in statuses:
+        for key, value in status.items():
+            if isinstance(value, dict):
+                output[key] = aggregate_status([output.get(key, {}), value])
+            elif isinstance(value, (int, float)) and not isinstance(value, bool):
+                output[key] = output.get(key, 0) + value
+            else:
+                output.setdefault(key, value)
+    return output
+
+
+def devices_online(status: Dict) -> float:
+    return status["devices"]["online"]
+
+
+def iv_ratio(status: Dict) -> float:
+    return status["pokemon"]["active_iv"] / (status["pokemon"]["active_total"] or 1) * 100
+
+
+def processing_queue(status: Dict) -> float:
+    return status["processing"]["current"]
+
+
+class StatusSampler:
+    def __init__(self, interval: float, history: int) -> None:
+        self.interval = interval
+        self.samples: Deque[StatusSample] = deque(maxlen=history)
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def latest(self) -> Optional[StatusSample]:
+        return self.samples[-1] if self.samples else None
+
+    @property
+    def fresh(self) -> bool:
+        # sample older than two intervals means the sampler is stuck or RDM is down
+        latest = self.latest
+        return latest is not None and time.time() - latest.timestamp < self.interval * 2
+
+    @property
+    def window(self) -> float:
+        if len(self.samples) < 2:
+            return 0
+        return self.samples[-1].timestamp - self.samples[0].timestamp
+
+    def trend(self, key: Callable[[Dict], float]) -> Optional[float]:
+        if len(self.samples) < 2:
+            return None
+        return key(self.samples[-1].status) - key(self.samples[0].status)
+
+    def record(self, backends: Dict[Text, Optional[Dict]]) -> Optional[StatusSample]:
+        statuses = [status for status in backends.values() if status]
+        if not statuses:
+            return None
+
+        sample = StatusSample(timestamp=time.time(), status=aggregate_status(statuses), backends=backends)
+        self.samples.append(sample)
+        return sample
+
+    async def sample(self) -> Optional[StatusSample]:
+        # failing backends are logged and skipped by get_status_all
+        return self.record(await RDMGetApi.get_status_all())
+
+    @with_priority(BACKGROUND)
+    async def run(self) -> None:
+        while True:
+            try:
+                await self.sample()
+            except httpx.RequestError as e:
+                log.warning(f"StatusSampler - sample failed: {type(e).__name__}: {e}")
+            except Exception as e:
+                capture_exception(e)
+                log.exception("StatusSampler - sample crashed")
+
+            await asyncio.sleep(self.interval)
+
+    def start(self) -> None:
+        if self._task is None or self._task.done():
+            self._task = asyncio.ensure_future(self.run())
+            log.debug(f"StatusSampler started, interval {self.interval}s")
+
+    def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+
+sampler = StatusSampler(interval=config.status_sampler.interval, history=config.status_sampler.history)
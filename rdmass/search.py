@@ -0,0 +1,33 @@
+import re
+from typing import Dict, List, Optional, Text
+
+TOKEN_RE = re.compile(r"[^\W_]+")
+
+
+def tokens(text: Text) -> List[Text]:
+    return TOKEN_RE.findall(text.lower())
+
+
+def rank(label: Text, query: Text, terms: List[Text]) -> int:
+    if label.startswith(query):
+        return 0
+    if all(any(token.startswith(term) for token in tokens(label)) for term in terms):
+        return 1
+    return 2
+
+
+def search_labels(rows: List[Dict], query: Optional[Text], key: Text = "label") -> List[Dict]:
+    terms = tokens(query or "")
+    if not terms:
+        return rows
+
+    # every term has to be contained in label, best matches first so they land on the first page
+    # option lists are rebuilt per command, a single scan is cheaper than indexing them
+    query = query.strip().lower()
+    matches = []
+    for position, row in enumerate(rows):
+        label = str(row.get(key) or "").lower()
+        if all(term in label for term in terms):
+            matches.append((rank(label, query, terms), position, row))
+
+    return [row for _, _, row in sorted(matches, key=lambda match: match[:2])]
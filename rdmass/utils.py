@@ -1,35 +1,53 @@
+import asyncio
 import aiofiles
 import aiofiles.os
 import arrow
+import hashlib
 import httpx
 import simplejson as json
+import time
 from datetime import timedelta
 from dateutil import tz
-from discord import Client
+from discord import Client, Object
 from discord_slash import ComponentContext
+from discord_slash.model import ComponentMessage, SlashMessage
 from discord_slash.utils import manage_components
 from sentry_sdk import capture_exception
-from timeit import default_timer as timer
-from typing import Set, Text, Dict, List, Tuple, Union, cast, Any, Callable, TypeVar, Optional
-from dataclasses import dataclass
-
-from rdmass.config import config, logging, scheduler, past_events_path
-from rdmass.rdm import RDMGetApi, RDMSetApi
+from typing import Set, Text, Dict, List, Tuple, Union, Any, Awaitable, Callable, Optional
+from dataclasses import dataclass, field
+
+from rdmass.config import config, logging, scheduler, past_events_path, events_cache_path
+from rdmass.eventloop import run_blocking
+from rdmass.history import history
+from rdmass.metrics import DISCORD_REQUEST_DURATION
+from rdmass.notify import Notifier
+from rdmass.profiling import timeit
+from rdmass.planner import EventPlan, PlannerSettings, feed_dates, plan_events
+from rdmass.rdm import RDMGetApi, RDMSetApi, backends, split_target
+from rdmass.sampler import aggregate_status, devices_online, iv_ratio, processing_queue, sampler
 
 log = logging.getLogger(__name__)
 
-F = TypeVar("F", bound=Callable[..., Any])
+# hash of the last fully processed events feed
+events_feed_hash: Optional[Text] = None
 
 
 @dataclass
-class Event:
-    name: str
-    type: str
-    has_quests: bool
-    accepted_hours: bool = False
-    accepted_diff: bool = False
-    date: Optional[str] = None
-    date_arrow: Optional[arrow.arrow.Arrow] = None
+class AssignmentReport:
+    action: str
+    results: Dict[str, bool] = field(default_factory=dict)
+
+    @property
+    def succeeded(self) -> List[str]:
+        return [name for name, success in self.results.items() if success]
+
+    @property
+    def failed(self) -> List[str]:
+        return [name for name, success in self.results.items() if not success]
+
+    @property
+    def success(self) -> bool:
+        return all(self.results.values())
 
 
 def create_action_list(
@@ -147,27 +165,105 @@ async def handle_bot_list(
             return assignment_groups, saved_choices
 
 
-# noinspection PyUnboundLocalVariable
-async def get_status_message() -> Text:
-    try:
-        status = await RDMGetApi.get_status()
-    except httpx.RequestError as e:
-        capture_exception(e)
-        message = f"Status fetch failed!\nError: {type(e).__name__}: {e}"
+def format_trend(delta: Optional[float], precision: int = 0) -> Text:
+    if delta is None:
+        return ""
+    return f" [{delta:+.{precision}f} in {sampler.window / 60:.0f}m]"
+
+
+def format_status_message(status: Dict, trends: bool = False) -> Text:
+    devices_trend = format_trend(sampler.trend(devices_online)) if trends else ""
+    iv_trend = format_trend(sampler.trend(iv_ratio), precision=2) if trends else ""
+    processing_trend = format_trend(sampler.trend(processing_queue)) if trends else ""
+
+    return (
+        f"**Processing** {status['processing']['current']}/{status['processing']['max']} "
+        f"({status['processing']['ignored']} ignored, {status['processing']['total']} total){processing_trend}\n"
+        f"**Pokemon** {status['pokemon']['active_iv']}/{status['pokemon']['active_total']} "
+        f"({iv_ratio(status):.2f}%){iv_trend}\n"
+        f"**Devices** {status['devices']['online']}/{status['devices']['total']}{devices_trend}"
+    )
+
+
+def format_backend_line(name: Text, status: Optional[Dict], error: Optional[Text]) -> Text:
+    backend = backends[name]
+    api = backend.breaker.describe()
+    # requests waiting for rate limiter per priority, shown next to circuit state
+    if backend.limiter.enabled:
+        api += f", {backend.limiter.describe()}"
+
+    if len(backends) == 1:
+        return (f"Error: {error}\n" if error else "") + f"**RDM API** {api}"
+
+    if not status:
+        return f"**[{name}]** fetch failed{f' ({error})' if error else ''}, API {api}"
+
+    return (
+        f"**[{name}]** Devices {status['devices']['online']}/{status['devices']['total']}, "
+        f"IV {iv_ratio(status):.2f}%, Processing {status['processing']['current']}/{status['processing']['max']}, "
+        f"API {api}"
+    )
+
+
+@timeit
+async def get_status_message(live: bool = False) -> Text:
+    # live fetch is used by Refresh button, sampled status can be up to two intervals old
+    sample = sampler.latest if config.status_sampler.enabled and sampler.fresh and not live else None
+    sampled = sample is not None
+    statuses = {}
+    errors = {}
+
+    if sample:
+        statuses = sample.backends
     else:
-        message = (
-            (
-                f"**Processing** {status['processing']['current']}/{status['processing']['max']} "
-                f"({status['processing']['ignored']} ignored, {status['processing']['total']} total)\n"
-                f"**Pokemon** {status['pokemon']['active_iv']}/{status['pokemon']['active_total']} "
-                f"({status['pokemon']['active_iv'] / (status['pokemon']['active_total'] or 1) * 100:.2f}%)\n"
-                f"**Devices** {status['devices']['online']}/{status['devices']['total']}"
-            )
-            if status
-            else "Status fetch failed!"
-        )
-    finally:
-        return message
+        request_errors: Dict[Text, httpx.RequestError] = {}
+        statuses = await RDMGetApi.get_status_all(request_errors)
+        for name, error in request_errors.items():
+            capture_exception(error)
+            errors[name] = f"{type(error).__name__}: {error}"
+
+        # fetched status joins sampled history, so trends are shown for it too
+        if config.status_sampler.enabled:
+            sample = sampler.record(statuses)
+
+    valid_statuses = [status for status in statuses.values() if status]
+    if valid_statuses:
+        message = format_status_message(aggregate_status(valid_statuses), trends=sample is not None)
+    else:
+        message = "Status fetch failed!"
+
+    if sampled:
+        message += f"\n_Sampled {time.time() - sample.timestamp:.0f}s ago_"
+
+    for name in backends:
+        message += "\n" + format_backend_line(name, statuses.get(name), errors.get(name))
+
+    return message
+
+
+async def start_progress(ctx: ComponentContext, content: Text) -> ComponentMessage:
+    await ctx.edit_origin(content=content, components=None)
+    if ctx.origin_message is not None:
+        return ctx.origin_message
+
+    # hidden origin isn't exposed by discord_slash, progress goes to a hidden follow-up instead
+    data = await ctx.send(content, hidden=True)
+    return SlashMessage(
+        state=ctx.bot._connection,
+        channel=ctx.channel or Object(id=ctx.channel_id),
+        data=data,
+        _http=ctx._http,
+        interaction_token=ctx._token,
+    )
+
+
+async def edit_progress(message: ComponentMessage, content: Text) -> None:
+    with DISCORD_REQUEST_DURATION.time(call="edit_progress"):
+        if isinstance(message, SlashMessage):
+            # hidden messages can be edited only through the interaction webhook
+            await message._slash_edit(content=content)
+        else:
+            await message.edit(content=content)
 
 
 async def handle_dt_picker(client: Client, ctx: ComponentContext) -> Tuple[ComponentContext, arrow.Arrow, arrow.Arrow]:
@@ -256,146 +352,257 @@ async def handle_dt_picker(client: Client, ctx: ComponentContext) -> Tuple[Compo
     return minutes_ctx, dt_output_utc, dt_output
 
 
-async def handle_assignment_group(assignments_groups: Union[Set, List[Text]], action: Text) -> bool:
-    status = True
-    try:
-        ra = RDMSetApi()
-        for assignment_group in assignments_groups:
-            assert await ra.assignment_group(name=assignment_group, re_quest=action == "request")
-    except (AssertionError, httpx.RequestError) as e:
-        capture_exception(e)
-        status = False
-    finally:
-        return status
+async def dispatch_concurrently(
+    names: List[Text],
+    call: Callable[[Text], Awaitable[bool]],
+    progress: Optional[Callable[[int, int], Awaitable[None]]] = None,
+) -> Dict[Text, bool]:
+    semaphore = asyncio.Semaphore(config.instance.rdm.concurrency)
+    done = 0
+
+    async def dispatch(name: Text) -> bool:
+        nonlocal done
+
+        async with semaphore:
+            try:
+                assert await call(name)
+            except (AssertionError, httpx.RequestError) as e:
+                capture_exception(e)
+                log.warning(f"dispatch_concurrently - {call.__name__} {name} failed")
+                success = False
+            else:
+                success = True
 
+        done += 1
+        if progress:
+            await progress(done, len(names))
+        return success
 
-async def handle_clean() -> bool:
-    status = True
-    try:
-        assert await RDMSetApi.clear_all_quests()
-    except (AssertionError, httpx.RequestError) as e:
-        capture_exception(e)
-        status = False
-    finally:
-        return status
+    results = await asyncio.gather(*[dispatch(name) for name in names])
+    return dict(zip(names, results))
+
+
+@timeit
+async def handle_assignment_group(assignments_groups: Union[Set, List[Text]], action: Text) -> AssignmentReport:
+    async def assignment_group(target: Text) -> bool:
+        backend, name = split_target(target)
+        return await RDMSetApi.assignment_group(name=name, re_quest=action == "request", backend=backend)
+
+    return AssignmentReport(
+        action=action, results=await dispatch_concurrently(list(assignments_groups), assignment_group)
+    )
 
 
-def timeit(func: F) -> F:
-    def wrapper(*args, **kwargs):
-        start = timer()
-        result = func(*args, **kwargs)
-        end = timer()
-        log.debug(f"{func.__name__} took {timedelta(seconds=end-start)}")
-        return result
+@timeit
+async def handle_device_assignment(
+    devices: List[Text],
+    device_groups: List[Text],
+    instance: Text,
+    progress: Optional[Callable[[int, int], Awaitable[None]]] = None,
+    backend: Optional[Text] = None,
+) -> AssignmentReport:
+    async def assign_device(name: Text) -> bool:
+        return await RDMSetApi.assign_device(name, instance, backend=backend)
+
+    async def assign_device_group(name: Text) -> bool:
+        return await RDMSetApi.assign_device_group(name, instance, backend=backend)
+
+    total = len(devices) + len(device_groups)
+    done_groups = 0
+
+    async def groups_progress(done: int, _: int) -> None:
+        nonlocal done_groups
+        done_groups = done
+        if progress:
+            await progress(done, total)
+
+    async def devices_progress(done: int, _: int) -> None:
+        if progress:
+            await progress(done_groups + done, total)
+
+    # groups first, single devices may override the group target afterwards
+    report = AssignmentReport(action=f"assign {instance}")
+    # groups are keyed apart from devices, a device group may share its name with a device
+    group_results = await dispatch_concurrently(device_groups, assign_device_group, groups_progress)
+    report.results.update((f"[Group] {name}", success) for name, success in group_results.items())
+    report.results.update(await dispatch_concurrently(devices, assign_device, devices_progress))
+    return report
+
+
+def get_assignment_message(report: AssignmentReport, job_type: Text) -> Text:
+    return (
+        config.message.tech_channel_message_success if report.success else config.message.tech_channel_message_fail
+    ).format(
+        **{
+            "action": report.action,
+            "type": job_type,
+            "assignments_groups": ", ".join(report.results),
+            "failed_groups": ", ".join(report.failed),
+        }
+    )
+
+
+def get_device_assignment_message(
+    report: AssignmentReport, instance: Text, job_type: Text, devices: int, device_groups: int
+) -> Text:
+    return (
+        config.message.tech_channel_message_assign_success
+        if report.success
+        else config.message.tech_channel_message_assign_fail
+    ).format(
+        **{
+            "type": job_type,
+            "instance": instance,
+            "targets": f"{devices} devices, {device_groups} device groups",
+            # keep message readable for big fleets
+            "failed": truncate(", ".join(report.failed), 1000),
+        }
+    )
 
-    return cast(F, wrapper)
+
+def truncate(content: Text, limit: int) -> Text:
+    return content if len(content) <= limit else content[: limit - 3] + "..."
+
+
+@timeit
+async def handle_clean(backend_names: Optional[List[Text]] = None) -> AssignmentReport:
+    # every backend unless specific ones are given, report is keyed by backend name
+    async def clear_all_quests(backend: Text) -> bool:
+        return await RDMSetApi.clear_all_quests(backend=backend)
+
+    return AssignmentReport(
+        action="clean", results=await dispatch_concurrently(list(backend_names or backends), clear_all_quests)
+    )
+
+
+@timeit
+async def handle_reload(backend_names: Optional[List[Text]] = None) -> AssignmentReport:
+    async def reload_instances(backend: Text) -> bool:
+        return await RDMSetApi.reload_instances(backend=backend)
+
+    return AssignmentReport(
+        action="reload", results=await dispatch_concurrently(list(backend_names or backends), reload_instances)
+    )
+
+
+def get_backends_result_message(report: AssignmentReport, success: Text, fail: Text) -> Text:
+    if report.success:
+        return success
+    return fail + (f" Failed backends: {', '.join(report.failed)}" if len(backends) > 1 else "")
 
 
 # TODO: Auto migrate old Schedules. Remove me after some time
 def scheduler_migration() -> None:
     for job in scheduler.get_jobs():
-        if len(job.args) > 2:
+        if job.func_ref.endswith(":sched_assignment_group") and len(job.args) > 2:
             scheduler.modify_job(job_id=job.id, args=job.args[:2])
 
 
-async def handle_auto_events(bot_client: Client, scheduler_target: Any) -> None:
-    # sanity checks
-    if not config.auto_event.enabled and config.auto_event.quest_instances:
-        return
+async def load_events_cache() -> Optional[Dict]:
+    if not await aiofiles.os.path.exists(events_cache_path):
+        return None
 
-    # check if past_events file exists
-    past_events_path_exists = await aiofiles.os.path.exists(past_events_path)
-    if not past_events_path_exists:
-        log.debug("handle_events - creating past_events file")
-        past_event_dates = {"main": set(), "filtered": set()}
-        async with aiofiles.open(past_events_path, mode="w") as f:
-            await f.write(json.dumps(past_event_dates, iterable_as_array=True))
+    try:
+        async with aiofiles.open(events_cache_path, mode="r") as f:
+            return await run_blocking(json.loads, await f.read())
+    except (OSError, ValueError) as e:
+        log.warning(f"handle_events - ignoring broken events cache: {type(e).__name__}: {e}")
+        return None
 
-    else:
-        log.debug("handle_events - loaded past_events file")
-        # load previously added job dates
-        async with aiofiles.open(past_events_path, mode="r") as f:
-            contents = await f.read()
-            past_event_dates = json.loads(contents)
-
-            # remove someday :^)
-            if isinstance(past_event_dates, list):
-                past_event_dates = {"main": set(past_event_dates), "filtered": set()}
-            else:
-                past_event_dates = {
-                    "main": set(past_event_dates["main"]),
-                    "filtered": set(past_event_dates["filtered"]),
-                }
 
-    # fetch events from remote
-    async with httpx.AsyncClient(timeout=config.auto_event.http_timeout) as client:
-        response = await client.get(config.resource.pogoinfo_events, headers={"user-agent": config.bot.user_agent})
-        log.info(f"httpx GET pogoinfo events")
+async def save_events_cache(events_cache: Dict) -> None:
+    # write & rename so crash never leaves half written cache
+    async with aiofiles.open(f"{events_cache_path}.tmp", mode="w") as f:
+        await f.write(await run_blocking(json.dumps, events_cache))
+    await aiofiles.os.replace(f"{events_cache_path}.tmp", events_cache_path)
 
-    raw_events = response.json()
-    log.debug("handle_events - fetched pogoinfo events")
 
-    events = []
-    filtered_events = []
-    beginning_dates = set()
-    beginning_dates_filtered = set()
-    now = arrow.now(tz=config.locale.timezone)
-
-    # iterate all events in source and created 2 events (starting and ending) for each event
-    for event_row in raw_events:
-        # include only selected event types
-        if event_row["type"] not in config.auto_event.types:
-            continue
-
-        # process both start and the end of the event
-        for event_type in ("start", "end"):
-            event = Event(
-                name=event_row["name"],
-                type=event_row["type"],
-                has_quests=event_row["has_quests"],
-            )
+@timeit
+async def fetch_events_feed() -> Tuple[List[Dict], Text]:
+    events_cache = await load_events_cache()
+    headers = {"user-agent": config.bot.user_agent}
 
-            if not event_row[event_type]:
-                continue
+    if events_cache:
+        if events_cache.get("etag"):
+            headers["if-none-match"] = events_cache["etag"]
+        if events_cache.get("last_modified"):
+            headers["if-modified-since"] = events_cache["last_modified"]
 
-            event.beginning = event_type == "start"
-            event.date = event_row["start"] if event.beginning else event_row["end"]
-            event.date_arrow = arrow.get(event.date, tzinfo=config.locale.timezone)
+    try:
+        async with httpx.AsyncClient(timeout=config.auto_event.http_timeout) as client:
+            response = await client.get(config.resource.pogoinfo_events, headers=headers)
+            log.info(f"httpx GET pogoinfo events ({response.status_code})")
 
-            if config.auto_event.time_range[0] <= event.date_arrow.hour <= config.auto_event.time_range[1]:
-                event.accepted_hours = True
+        if events_cache and response.status_code == httpx.codes.NOT_MODIFIED:
+            return events_cache["events"], events_cache["hash"]
 
-            if (event.date_arrow - now).total_seconds() > config.auto_event.skip_diff:
-                event.accepted_diff = True
+        response.raise_for_status()
+        raw_events = await run_blocking(json.loads, response.content)
+    except (httpx.HTTPError, ValueError) as e:
+        if not events_cache:
+            raise
 
-            if event.has_quests and event.accepted_hours and event.accepted_diff:
-                if event.beginning:
-                    beginning_dates.add(event.date)
-                events.append(event)
-            else:
-                if event.beginning:
-                    beginning_dates_filtered.add(event.date)
-                filtered_events.append(event)
-
-    log.debug(f"handle_events - got {len(events)} events before cleanup")
-
-    # use end events only when there's no beginning event with same date
-    events = [
-        event
-        for event in events
-        if event.date not in past_event_dates["main"]
-        and (event.beginning or not event.beginning and event.date not in beginning_dates)
-    ]
+        capture_exception(e)
+        log.warning(f"handle_events - events fetch failed, using cached copy: {type(e).__name__}: {e}")
+        return events_cache["events"], events_cache["hash"]
+
+    feed_hash = hashlib.sha256(response.content).hexdigest()
+
+    if not events_cache or events_cache["hash"] != feed_hash:
+        await save_events_cache(
+            {
+                "etag": response.headers.get("etag"),
+                "last_modified": response.headers.get("last-modified"),
+                "hash": feed_hash,
+                "events": raw_events,
+            }
+        )
 
-    filtered_events = [
-        event
-        for event in filtered_events
-        if event.date not in past_event_dates["filtered"].union(past_event_dates["main"])
-        and (event.beginning or not event.beginning and event.date not in beginning_dates_filtered)
-    ]
+    return raw_events, feed_hash
+
+
+def prepare_events(raw_events: List[Dict], settings: PlannerSettings) -> EventPlan:
+    # sqlite and arrow parsing heavy, runs in blocking executor
+    # load previously added job dates, only for dates present in the feed
+    dates = feed_dates(raw_events, settings)
+    history.import_legacy(past_events_path)
+    past_event_dates = history.known(dates)
+    history.touch(dates)
+    history.prune(config.auto_event.history_retention_days * 86400)
+
+    return plan_events(raw_events, past_event_dates, settings, arrow.now(tz=config.locale.timezone))
+
+
+@timeit
+async def handle_auto_events(notifier: Notifier, scheduler_target: Any, workflow_target: Any = None) -> None:
+    global events_feed_hash
+
+    # sanity checks
+    if not config.auto_event.enabled and config.auto_event.quest_instances:
+        return
+
+    # fetch events from remote
+    raw_events, feed_hash = await fetch_events_feed()
+    log.debug("handle_events - fetched pogoinfo events")
+
+    # same feed was already fully processed
+    if feed_hash == events_feed_hash:
+        log.debug("handle_events - events feed unchanged")
+        return
+
+    settings = PlannerSettings(
+        types=config.auto_event.types,
+        time_range=config.auto_event.time_range,
+        skip_diff=config.auto_event.skip_diff,
+        timezone=config.locale.timezone,
+    )
+
+    plan = await run_blocking(prepare_events, raw_events, settings)
+    events, filtered_events = plan.events, plan.filtered_events
 
     if not events and not filtered_events:
         log.debug(f"handle_events - no events to process")
+        events_feed_hash = feed_hash
         return
 
     log.debug(f"handle_events - got {len(events)} events and {len(filtered_events)} after cleanup")
@@ -421,16 +628,16 @@ async def handle_auto_events(bot_client: Client, scheduler_target: Any) -> None:
         )
         tech_output_message += config.message.tech_auto_event_request.format(**message_data)
 
-        scheduler.add_job(
+        # completion mode polls quest progress and may start IV before execution_time
+        completion_mode = config.auto_event.mode == "completion" and workflow_target is not None
+        await run_blocking(
+            scheduler.add_job,
             id=f"{event.date}-1",
-            func=scheduler_target,
+            func=workflow_target if completion_mode else scheduler_target,
             trigger="date",
             run_date=event.date_arrow.to("UTC").datetime,
             name=config.message.tech_auto_event_request_short.format(**message_data),
-            args=[
-                config.auto_event.quest_instances,
-                "request",
-            ],
+            args=[event.date] if completion_mode else [config.auto_event.quest_instances, "request"],
             replace_existing=True,
         )
 
@@ -440,7 +647,8 @@ async def handle_auto_events(bot_client: Client, scheduler_target: Any) -> None:
             user_output_message += config.message.user_auto_event_iv.format(**message_data)
             tech_output_message += config.message.tech_auto_event_iv.format(**message_data)
 
-            scheduler.add_job(
+            await run_blocking(
+                scheduler.add_job,
                 id=f"{event.date}-2",
                 func=scheduler_target,
                 trigger="date",
@@ -454,7 +662,6 @@ async def handle_auto_events(bot_client: Client, scheduler_target: Any) -> None:
             )
 
         log.debug(f"handle_events - added event {event.name} at {event.date} to scheduler")
-        past_event_dates["main"].add(event.date)
 
     for event in filtered_events:
         message_data = {
@@ -465,24 +672,20 @@ async def handle_auto_events(bot_client: Client, scheduler_target: Any) -> None:
             "state": (config.message.tech_auto_event_start if event.beginning else config.message.tech_auto_event_end),
         }
         tech_output_filtered_message += config.message.tech_auto_event_filtered.format(**message_data)
-        past_event_dates["filtered"].add(event.date)
 
     # save event dates
-    async with aiofiles.open(past_events_path, mode="w") as f:
-        log.debug(f"handle_events - saving past_events file")
-        await f.write(json.dumps(past_event_dates, iterable_as_array=True))
+    log.debug(f"handle_events - saving past events")
+    await run_blocking(history.add, [event.date for event in events], "main")
+    await run_blocking(history.add, [event.date for event in filtered_events], "filtered")
 
-    # handle tech messages
-    if config.instance.discord.tech_channel and tech_output_message:
-        tech_channel = await bot_client.fetch_channel(config.instance.discord.tech_channel)
+    events_feed_hash = feed_hash
 
-        if events:
-            await tech_channel.send(tech_output_message)
-        if filtered_events:
-            await tech_channel.send(tech_output_filtered_message)
+    # handle tech messages
+    if events:
+        notifier.send(config.instance.discord.tech_channel, tech_output_message)
+    if filtered_events:
+        notifier.send(config.instance.discord.tech_channel, tech_output_filtered_message)
 
     # handle user messages
-    if config.instance.discord.user_channel and user_output_message and events:
-        user_channel = await bot_client.fetch_channel(config.instance.discord.user_channel)
-
-        await user_channel.send(user_output_message)
+    if user_output_message and events:
+        notifier.send(config.instance.discord.user_channel, user_output_message)
@@ -0,0 +1,215 @@
+import asyncio
+import httpx
+import time
+from dataclasses import dataclass, field
+from sentry_sdk import capture_exception
+from typing import Dict, Iterable, List, Optional, Text, Tuple
+
+from rdmass.config import config, logging
+from rdmass.models import Device
+from rdmass.notify import Notifier
+from rdmass.rdm import RDMGetApi, RDMSetApi, gather_backends, qualify, split_target
+from rdmass.resilience import BACKGROUND, SCHEDULED, with_priority
+from rdmass.utils import handle_device_assignment
+
+log = logging.getLogger(__name__)
+
+ONLINE = "online"
+STALE = "stale"
+OFFLINE = "offline"
+
+# device uuid -> (instance, state), tuples keep snapshot of thousands of devices small
+DeviceStates = Dict[Text, Tuple[Optional[Text], Text]]
+
+
+@dataclass
+class DeviceDiff:
+    offline: List[Text] = field(default_factory=list)
+    stale: List[Text] = field(default_factory=list)
+    recovered: List[Text] = field(default_factory=list)
+    moved: List[Tuple[Text, Optional[Text], Optional[Text]]] = field(default_factory=list)
+
+    def __bool__(self) -> bool:
+        return bool(self.offline or self.stale or self.recovered or self.moved)
+
+
+def device_state(last_seen: Optional[float], now: float, stale_after: float, offline_after: float) -> Text:
+    age = now - (last_seen or 0)
+    if age >= offline_after:
+        return OFFLINE
+    if age >= stale_after:
+        return STALE
+    return ONLINE
+
+
+def build_states(devices: Iterable[Device], now: float, stale_after: float, offline_after: float) -> DeviceStates:
+    return {
+        device.uuid: (device.instance, device_state(device.last_seen, now, stale_after, offline_after))
+        for device in devices
+    }
+
+
+def diff_states(previous: DeviceStates, current: DeviceStates) -> DeviceDiff:
+    diff = DeviceDiff()
+
+    for uuid, state in current.items():
+        old = previous.get(uuid)
+        # unchanged devices cost a single dict lookup and tuple compare
+        if old is None or old == state:
+            continue
+
+        if old[0] != state[0]:
+            diff.moved.append((uuid, old[0], state[0]))
+        if old[1] != state[1]:
+            {OFFLINE: diff.offline, STALE: diff.stale, ONLINE: diff.recovered}[state[1]].append(uuid)
+
+    return diff
+
+
+def track_stalls(
+    previous: DeviceStates, current: DeviceStates, diff: DeviceDiff, stalled_since: Dict[Text, float], now: float
+) -> None:
+    # only devices seen dropping out of online are tracked, long dead ones never count as a fresh stall
+    for uuid in diff.stale + diff.offline:
+        if previous[uuid][1] == ONLINE:
+            stalled_since[uuid] = now
+    for uuid in diff.recovered:
+        stalled_since.pop(uuid, None)
+    for uuid in [uuid for uuid in stalled_since if uuid not in current]:
+        del stalled_since[uuid]
+
+
+def stalled_instances(
+    current: DeviceStates, stalled_since: Dict[Text, float], since: float, threshold: int
+) -> Dict[Text, List[Text]]:
+    # instance -> devices which stalled on it after `since`
+    output: Dict[Text, List[Text]] = {}
+    for uuid, stalled_at in stalled_since.items():
+        instance, state = current[uuid]
+        if instance and state != ONLINE and stalled_at >= since:
+            output.setdefault(instance, []).append(uuid)
+    return {instance: devices for instance, devices in output.items() if len(devices) >= threshold}
+
+
+class DeviceWatchdog:
+    def __init__(self, notifier: Notifier) -> None:
+        self.notifier = notifier
+        self.settings = config.device_watchdog
+        self.states: Optional[DeviceStates] = None
+        self._stalled_since: Dict[Text, float] = {}
+        self._actions: Dict[Text, float] = {}
+
+        if self.settings.enabled and self.settings.stall_action == "reassign" and not self.settings.reassign_instance:
+            raise ValueError("device_watchdog.reassign_instance is required for stall_action reassign")
+        self._task: Optional[asyncio.Task] = None
+
+    def format_diff(self, diff: DeviceDiff) -> Text:
+        lines = (
+            [f":red_circle: {uuid} went offline" for uuid in diff.offline]
+            + [f":yellow_circle: {uuid} went stale" for uuid in diff.stale]
+            + [f":green_circle: {uuid} is back online" for uuid in diff.recovered]
+            + [f":arrow_right: {uuid} moved {old} -> {new}" for uuid, old, new in diff.moved]
+        )
+        hidden = len(lines) - self.settings.max_lines
+
+        message = (
+            f"**[Watchdog]** {len(diff.offline)} offline, {len(diff.stale)} stale, "
+            f"{len(diff.recovered)} recovered, {len(diff.moved)} moved\n"
+        )
+        message += "\n".join(lines[: self.settings.max_lines])
+        if hidden > 0:
+            message += f"\n... and {hidden} more"
+        return message
+
+    # remediation changes RDM state, it must not queue behind reads
+    @with_priority(SCHEDULED)
+    async def handle_stalled(self, current: DeviceStates, now: float) -> None:
+        action = self.settings.stall_action
+        if action not in ("reload", "reassign") or not self.settings.stall_threshold:
+            return
+
+        stalled = stalled_instances(
+            current, self._stalled_since, now - self.settings.stall_window, self.settings.stall_threshold
+        )
+        # backend -> {instance: stalled devices}
+        backends: Dict[Text, Dict[Text, List[Text]]] = {}
+        for instance, devices in stalled.items():
+            if now - self._actions.get(instance, 0) < self.settings.action_cooldown:
+                continue
+            self._actions[instance] = now
+            backends.setdefault(split_target(instance)[0], {})[instance] = devices
+
+        for backend, instances in backends.items():
+            count = sum(len(devices) for devices in instances.values())
+            names = ", ".join(f"**{instance}**" for instance in sorted(instances))
+
+            # reload covers the whole backend, so it runs once no matter how many instances stalled
+            if action == "reload":
+                success = await RDMSetApi.reload_instances(backend=backend)
+            else:
+                devices = [split_target(uuid)[1] for uuids in instances.values() for uuid in uuids]
+                report = await handle_device_assignment(devices, [], self.settings.reassign_instance, backend=backend)
+                success = report.success
+
+            self.notifier.send(
+                config.instance.discord.tech_channel,
+                f"**[Watchdog]** {count} devices stalled on {names}, {action} {'succeeded' if success else 'failed'}",
+            )
+
+    async def check(self) -> Optional[DeviceDiff]:
+        backend_devices = await gather_backends(lambda name: RDMGetApi.get_devices(backend=name))
+        if all(devices is None for devices in backend_devices.values()):
+            return None
+
+        # device and instance names are qualified with backend name for non default backends
+        current = {}
+        now = time.time()
+        for backend, devices in backend_devices.items():
+            # keep last known states of backend which failed to respond
+            if devices is None:
+                current.update(
+                    {uuid: state for uuid, state in (self.states or {}).items() if split_target(uuid)[0] == backend}
+                )
+                continue
+
+            for uuid, (instance, state) in build_states(
+                devices, now, self.settings.stale_after, self.settings.offline_after
+            ).items():
+                current[qualify(backend, uuid)] = (qualify(backend, instance) if instance else instance, state)
+
+        previous, self.states = self.states, current
+
+        # first poll only builds baseline
+        if previous is None:
+            return None
+
+        diff = diff_states(previous, current)
+        track_stalls(previous, current, diff, self._stalled_since, now)
+        if diff:
+            self.notifier.send(config.instance.discord.tech_channel, self.format_diff(diff))
+
+        await self.handle_stalled(current, now)
+        return diff
+
+    @with_priority(BACKGROUND)
+    async def run(self) -> None:
+        while True:
+            try:
+                await self.check()
+            except httpx.RequestError as e:
+                log.warning(f"DeviceWatchdog - check failed: {type(e).__name__}: {e}")
+            except Exception as e:
+                capture_exception(e)
+                log.exception("DeviceWatchdog - check crashed")
+
+            await asyncio.sleep(self.settings.interval)
+
+    def start(self) -> None:
+        if self._task is None or self._task.done():
+            self._task = asyncio.ensure_future(self.run())
+            log.debug(f"DeviceWatchdog started, interval {self.settings.interval}s")
+
+    def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
@@ -0,0 +1,112 @@
+import asyncio
+import re
+from typing import Any, Awaitable, Callable, List, Optional, Text, Tuple
+
+from rdmass.config import config, logging, scheduler
+from rdmass.eventloop import run_blocking
+from rdmass.notify import Notifier
+from rdmass.rdm import RDMGetApi, qualify, split_target
+from rdmass.utils import handle_clean
+
+log = logging.getLogger(__name__)
+
+PROGRESS_RE = re.compile(r"(\d+)\s*[|/]\s*(\d+)")
+
+
+def quest_progress(status: Any) -> Optional[Tuple[int, int]]:
+    # RDM reports auto_quest status either raw (dict) or formatted ("Status: 120|450 (26.7%)")
+    if isinstance(status, dict):
+        if "bootstrapping" in status:
+            return 0, max(status["bootstrapping"].get("total_count") or 1, 1)
+
+        quests = status.get("quests")
+        if isinstance(quests, dict) and quests.get("total_count"):
+            current = quests.get("current_count_db", quests.get("current_count")) or 0
+            return current, quests["total_count"]
+        return None
+
+    if isinstance(status, str):
+        if "bootstrap" in status.lower():
+            return 0, 1
+        match = PROGRESS_RE.search(status)
+        if match and int(match.group(2)):
+            return int(match.group(1)), int(match.group(2))
+
+    return None
+
+
+def quest_backends(quest_groups: List[Text]) -> List[Text]:
+    return sorted({split_target(group)[0] for group in quest_groups})
+
+
+async def get_quest_progress(progress_instances: List[Text]) -> Optional[float]:
+    # only instances behind quest_instances count, other finished ones would start IV too early
+    tracked = set(progress_instances)
+    backends = quest_backends(progress_instances)
+    backend_instances = await asyncio.gather(
+        *[RDMGetApi.get_instances(skip_status=False, backend=backend) for backend in backends]
+    )
+
+    current = total = 0
+    for backend, rows in zip(backends, backend_instances):
+        for row in rows or []:
+            name = qualify(backend, row.name)
+            if name not in tracked:
+                continue
+
+            progress = quest_progress(row.status)
+            if progress is None:
+                continue
+            current += progress[0]
+            total += progress[1]
+
+    return current / total if total else None
+
+
+async def run_quest_workflow(
+    event_id: Text, assign: Callable[[List[Text], Text], Awaitable[None]], notifier: Notifier
+) -> None:
+    settings = config.auto_event
+    loop = asyncio.get_event_loop()
+    # "{event}-2" IV start job stays scheduled at execution_time, it is the hard upper bound surviving restarts
+    deadline = loop.time() + settings.execution_time * 60
+
+    if settings.clear_quests:
+        report = await handle_clean(quest_backends(settings.quest_instances))
+        if not report.success:
+            log.warning(f"quest workflow {event_id} - clearing quests failed on {', '.join(report.failed)}")
+
+    await assign(settings.quest_instances, "request")
+    if not settings.iv_instances:
+        return
+
+    progress = None
+    while True:
+        await asyncio.sleep(settings.progress_interval)
+        if loop.time() >= deadline:
+            log.info(f"quest workflow {event_id} - execution_time reached, IV start left to scheduled job")
+            return
+
+        try:
+            progress = await get_quest_progress(settings.progress_instances)
+        except Exception as e:
+            log.warning(f"quest workflow {event_id} - progress check failed: {type(e).__name__}: {e}")
+            continue
+
+        log.debug(f"quest workflow {event_id} - quest progress {progress}")
+        if progress is not None and progress >= settings.completion_threshold:
+            break
+
+    from apscheduler.jobstores.base import JobLookupError
+
+    # upper bound job already fired or was removed by user, nothing left to do
+    try:
+        await run_blocking(scheduler.remove_job, f"{event_id}-2")
+    except JobLookupError:
+        return
+
+    notifier.send(
+        config.instance.discord.tech_channel,
+        config.message.tech_auto_event_quests_done.format(**{"event": event_id, "progress": f"{progress * 100:.1f}"}),
+    )
+    await assign(settings.iv_instances, "start")
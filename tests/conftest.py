@@ -0,0 +1,8 @@
+import os
+import sys
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+
+# rdmass loads its config on import, tests run against the example config
+os.environ.setdefault("RDMASS_CONFIG", os.path.join(ROOT, "config.example.json"))
+sys.path.insert(0, ROOT)
@@ -0,0 +1,118 @@
+from datetime import datetime, timedelta, timezone
+from typing import Any, List, NamedTuple, Text
+
+from rdmass.catchup import plan_catchup
+
+NOW = datetime(2022, 5, 1, 12, tzinfo=timezone.utc)
+
+
+class FakeJob(NamedTuple):
+    id: Text
+    func_ref: Text
+    args: List[Any]
+    next_run_time: datetime
+
+    @property
+    def name(self) -> Text:
+        return self.id
+
+
+def assignment(job_id, groups, action, minutes_ago):
+    return FakeJob(job_id, "rdmass.bot:sched_assignment_group", [groups, action], NOW - timedelta(minutes=minutes_ago))
+
+
+def clean(job_id, minutes_ago, backend=None):
+    args = [backend] if backend else []
+    return FakeJob(job_id, "rdmass.bot:sched_clean", args, NOW - timedelta(minutes=minutes_ago))
+
+
+def workflow(job_id, minutes_ago):
+    return FakeJob(job_id, "rdmass.bot:sched_quest_workflow", [job_id[:-2]], NOW - timedelta(minutes=minutes_ago))
+
+
+def replayed(plan):
+    return [(job.id, args) for job, args in plan.replay]
+
+
+def skipped(plan):
+    return {job.id: reason for job, reason in plan.skipped}
+
+
+def test_jobs_over_max_age_are_skipped():
+    plan = plan_catchup([assignment("old", ["A"], "start", 120), assignment("new", ["B"], "start", 5)], NOW, 3600)
+    assert replayed(plan) == [("new", [["B"], "start"])]
+    assert skipped(plan) == {"old": "too old"}
+
+
+def test_iv_start_supersedes_request_of_same_event():
+    plan = plan_catchup(
+        [assignment("2022-05-01 10:00-1", ["Q"], "request", 60), assignment("2022-05-01 10:00-2", ["Q"], "start", 30)],
+        NOW,
+        3600,
+    )
+    assert replayed(plan) == [("2022-05-01 10:00-2", [["Q"], "start"])]
+    assert skipped(plan) == {"2022-05-01 10:00-1": "superseded by 2022-05-01 10:00-2"}
+
+
+def test_workflow_is_superseded_by_iv_start():
+    plan = plan_catchup(
+        [workflow("2022-05-01 10:00-1", 60), assignment("2022-05-01 10:00-2", ["Q"], "start", 30)], NOW, 3600
+    )
+    assert replayed(plan) == [("2022-05-01 10:00-2", [["Q"], "start"])]
+    assert list(skipped(plan)) == ["2022-05-01 10:00-1"]
+
+
+def test_latest_action_wins_per_group():
+    plan = plan_catchup(
+        [
+            assignment("first", ["A", "B"], "request", 50),
+            assignment("second", ["B", "C"], "start", 40),
+            assignment("third", ["C"], "request", 30),
+        ],
+        NOW,
+        3600,
+    )
+    # only groups without a later job are replayed, in original order
+    assert replayed(plan) == [
+        ("first", [["A"], "request"]),
+        ("second", [["B"], "start"]),
+        ("third", [["C"], "request"]),
+    ]
+    assert skipped(plan) == {}
+
+
+def test_fully_covered_assignment_is_skipped():
+    plan = plan_catchup(
+        [assignment("first", ["A", "B"], "request", 50), assignment("second", ["A", "B"], "start", 40)], NOW, 3600
+    )
+    assert replayed(plan) == [("second", [["A", "B"], "start"])]
+    assert skipped(plan) == {"first": "superseded by second"}
+
+
+def test_last_clean_per_backend_is_replayed():
+    plan = plan_catchup(
+        [
+            clean("clean-a1", 50, "a"),
+            clean("clean-b", 45, "b"),
+            clean("clean-a2", 40, "a"),
+        ],
+        NOW,
+        3600,
+    )
+    assert replayed(plan) == [("clean-b", ["b"]), ("clean-a2", ["a"])]
+    assert skipped(plan) == {"clean-a1": "superseded by clean-a2"}
+
+
+def test_clean_of_all_backends_supersedes_earlier_cleans():
+    plan = plan_catchup([clean("clean-a", 50, "a"), clean("clean-b", 45, "b"), clean("clean-all", 40)], NOW, 3600)
+    assert replayed(plan) == [("clean-all", [])]
+    assert skipped(plan) == {"clean-a": "superseded by clean-all", "clean-b": "superseded by clean-all"}
+
+
+def test_skipped_jobs_are_sorted_by_run_time():
+    plan = plan_catchup(
+        [clean("clean-2", 10), assignment("old", ["A"], "start", 500), clean("clean-1", 20), clean("clean-3", 5)],
+        NOW,
+        3600,
+    )
+    assert [job.id for job, _ in plan.skipped] == ["old", "clean-1", "clean-2"]
@@ -0,0 +1,75 @@
+import asyncio
+import pytest
+
+from rdmass import executor as executor_module
+from rdmass.executor import AssignmentExecutor, resolve_actions
+from rdmass.utils import AssignmentReport
+
+
+@pytest.fixture
+def calls(monkeypatch):
+    sent = []
+
+    async def handle_assignment_group(groups, action):
+        sent.append((list(groups), action))
+        return AssignmentReport(action, {group: group != "broken" for group in groups})
+
+    monkeypatch.setattr(executor_module, "handle_assignment_group", handle_assignment_group)
+    return sent
+
+
+def test_resolve_actions_last_rule_keeps_latest_action():
+    batch = [(["A", "B"], "request"), (["B"], "start"), (["A"], "request")]
+    assert resolve_actions(batch, "last") == {"A": ("request", 0), "B": ("start", 1)}
+
+
+@pytest.mark.parametrize("rule", ["request", "start"])
+def test_resolve_actions_preferred_action_wins(rule):
+    batch = [(["A"], "start"), (["A"], "request"), (["A"], "start")]
+    assert resolve_actions(batch, rule)["A"] == (rule, 1 if rule == "request" else 0)
+
+
+def test_resolve_actions_duplicates_stay_with_first_job():
+    assert resolve_actions([(["A"], "start"), (["A"], "start")], "last") == {"A": ("start", 0)}
+
+
+def test_unknown_conflict_rule_is_rejected():
+    with pytest.raises(ValueError):
+        AssignmentExecutor(window=0, conflict_rule="first")
+
+
+def test_execute_sends_request_before_start(calls):
+    results = asyncio.run(
+        AssignmentExecutor(window=0, conflict_rule="last").execute([(["S2", "S1"], "start"), (["R"], "request")])
+    )
+
+    assert calls == [(["R"], "request"), (["S1", "S2"], "start")]
+    assert results[0].report.results == {"S2": True, "S1": True}
+    assert results[1].report.results == {"R": True}
+
+
+def test_execute_reports_superseded_and_duplicate_groups(calls):
+    results = asyncio.run(
+        AssignmentExecutor(window=0, conflict_rule="last").execute(
+            [(["A", "B"], "request"), (["A"], "start"), (["B", "broken"], "request")]
+        )
+    )
+
+    assert calls == [(["B", "broken"], "request"), (["A"], "start")]
+    assert results[0].report.results == {"B": True}
+    assert results[0].skipped == {"A": "superseded by start"}
+    assert results[1].report.results == {"A": True}
+    assert results[2].report.results == {"broken": False}
+    assert results[2].skipped == {"B": "duplicate"}
+
+
+def test_jobs_within_window_share_one_batch(calls):
+    async def submit_both():
+        executor = AssignmentExecutor(window=0.01, conflict_rule="last")
+        return await asyncio.gather(executor.submit(["A"], "start"), executor.submit(["B"], "start"))
+
+    first, second = asyncio.run(submit_both())
+
+    assert calls == [(["A", "B"], "start")]
+    assert first.report.results == {"A": True}
+    assert second.report.results == {"B": True}
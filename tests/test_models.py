@@ -0,0 +1,31 @@
+import json
+
+from rdmass.models import Device, RecordIndex, decode_data
+
+
+def response(**data):
+    return json.dumps({"status": "ok", "data": data}).encode()
+
+
+def test_requested_sections_become_records():
+    content = response(
+        devices=[{"uuid": "dev1", "instance": "IV", "host": "10.0.0.1", "last_seen": 1.5, "account_username": "a"}],
+        status={"devices": {"online": 1}},
+        instances=[{"name": "IV", "type": "pokemon_iv"}],
+    )
+    output = decode_data(content, ["devices", "status"])
+
+    assert list(output) == ["devices", "status"]
+    assert isinstance(output["devices"], RecordIndex)
+    assert output["devices"].get("dev1") == Device("dev1", "IV", "10.0.0.1", 1.5)
+    assert output["status"] == {"devices": {"online": 1}}
+
+
+def test_missing_sections_are_empty():
+    output = decode_data(response(), ["devices", "status"])
+    assert len(output["devices"]) == 0
+    assert output["status"] is None
+
+
+def test_error_response_is_none():
+    assert decode_data(json.dumps({"status": "error", "error": "nope"}).encode(), ["devices"]) is None
@@ -0,0 +1,55 @@
+import arrow
+
+from rdmass.planner import PlannerSettings, feed_dates, plan_events
+
+SETTINGS = PlannerSettings(types=["event", "community-day"], time_range=[6, 20], skip_diff=300, timezone="UTC")
+NOW = arrow.get("2022-05-01 08:00", tzinfo="UTC")
+NO_PAST = {"main": set(), "filtered": set()}
+
+
+def event(name, start, end, type="event", has_quests=True):
+    return {"name": name, "type": type, "has_quests": has_quests, "start": start, "end": end}
+
+
+def planned(events):
+    return [(row.name, row.date, row.beginning) for row in events]
+
+
+def test_feed_dates_lists_selected_types_only():
+    raw = [event("A", "2022-05-01 10:00", "2022-05-01 18:00"), event("B", "2022-05-02 10:00", None, type="raid")]
+    assert feed_dates(raw, SETTINGS) == ["2022-05-01 10:00", "2022-05-01 18:00"]
+
+
+def test_events_outside_hours_or_too_close_are_filtered():
+    raw = [
+        event("Night", "2022-05-01 23:00", "2022-05-02 10:00"),
+        event("Soon", "2022-05-01 08:02", "2022-05-01 12:00"),
+        event("No quests", "2022-05-01 14:00", "2022-05-01 16:00", has_quests=False),
+    ]
+    plan = plan_events(raw, NO_PAST, SETTINGS, NOW)
+
+    assert planned(plan.events) == [("Night", "2022-05-02 10:00", False), ("Soon", "2022-05-01 12:00", False)]
+    assert planned(plan.filtered_events) == [
+        ("Night", "2022-05-01 23:00", True),
+        ("Soon", "2022-05-01 08:02", True),
+        ("No quests", "2022-05-01 14:00", True),
+        ("No quests", "2022-05-01 16:00", False),
+    ]
+
+
+def test_end_is_dropped_when_another_event_starts_at_same_date():
+    raw = [event("A", "2022-05-01 10:00", "2022-05-01 14:00"), event("B", "2022-05-01 14:00", "2022-05-01 18:00")]
+    plan = plan_events(raw, NO_PAST, SETTINGS, NOW)
+
+    assert planned(plan.events) == [
+        ("A", "2022-05-01 10:00", True),
+        ("B", "2022-05-01 14:00", True),
+        ("B", "2022-05-01 18:00", False),
+    ]
+
+
+def test_past_dates_are_not_planned_again():
+    raw = [event("A", "2022-05-01 10:00", "2022-05-01 18:00")]
+    plan = plan_events(raw, {"main": {"2022-05-01 10:00"}, "filtered": set()}, SETTINGS, NOW)
+
+    assert planned(plan.events) == [("A", "2022-05-01 18:00", False)]
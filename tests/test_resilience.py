@@ -0,0 +1,142 @@
+import asyncio
+import httpx
+import time
+import pytest
+from dotted_dict import DottedDict
+
+from rdmass.config import config
+from rdmass.rdm import RDMBackend
+from rdmass.resilience import BACKGROUND, CircuitBreaker, CircuitOpenError, PriorityLimiter
+
+
+def open_breaker(breaker, since=30):
+    for _ in range(breaker.failure_threshold):
+        breaker.record_failure()
+    breaker._opened_at = time.monotonic() - since
+    return breaker
+
+
+def half_open_breaker():
+    breaker = open_breaker(CircuitBreaker(failure_threshold=1, reset_timeout=30))
+    assert breaker.state == breaker.HALF_OPEN
+    return breaker
+
+
+def make_backend(handler, retries=2, failure_threshold=2):
+    settings = DottedDict(config.instance.rdm)
+    settings.retry = DottedDict({"retries": retries, "backoff_base": 0, "backoff_max": 0})
+    settings.circuit_breaker = DottedDict({"failure_threshold": failure_threshold, "reset_timeout": 30})
+    settings.rate_limit = DottedDict({"enabled": False, "rate": 1, "burst": 1})
+    backend = RDMBackend("test", settings)
+    backend.http_client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+    return backend
+
+
+def request(backend, path="/api/get_data"):
+    async def get():
+        try:
+            return await backend.client_get(path, {})
+        finally:
+            await backend.close_client()
+
+    return asyncio.run(get())
+
+
+def test_half_open_lets_single_probe_through():
+    breaker = half_open_breaker()
+    assert breaker.before_request() is True
+    with pytest.raises(CircuitOpenError):
+        breaker.before_request()
+
+    breaker.end_probe()
+    assert breaker.before_request() is True
+
+
+def test_failed_probe_reopens_circuit():
+    breaker = half_open_breaker()
+    breaker.before_request()
+    breaker.record_failure()
+    breaker.end_probe()
+    assert breaker.state == breaker.OPEN
+
+
+def test_closed_circuit_is_not_probing():
+    breaker = CircuitBreaker(failure_threshold=5, reset_timeout=30)
+    assert breaker.before_request() is False
+    assert breaker.before_request() is False
+
+
+def test_retries_count_as_one_failure():
+    calls = []
+
+    def handler(http_request):
+        calls.append(http_request)
+        return httpx.Response(503)
+
+    backend = make_backend(handler, retries=2, failure_threshold=2)
+    response = request(backend)
+
+    assert response.status_code == 503
+    assert len(calls) == 3
+    assert backend.breaker.failures == 1
+    assert backend.breaker.state == backend.breaker.CLOSED
+
+
+def test_recovered_retry_is_success():
+    statuses = [502, 200]
+
+    def handler(_):
+        return httpx.Response(statuses.pop(0), json={"status": "ok"})
+
+    backend = make_backend(handler, retries=2)
+    backend.breaker.failures = 1
+    response = request(backend)
+
+    assert response.status_code == 200
+    assert backend.breaker.failures == 0
+
+
+def test_cancelled_probe_releases_half_open_circuit():
+    async def handler(_):
+        await asyncio.sleep(10)
+        return httpx.Response(200)
+
+    backend = make_backend(handler)
+    open_breaker(backend.breaker)
+
+    async def cancel_probe():
+        task = asyncio.ensure_future(backend.client_get("/api/get_data", {}))
+        await asyncio.sleep(0.01)
+        with pytest.raises(CircuitOpenError):
+            await backend.client_get("/api/get_data", {})
+
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+        await backend.close_client()
+
+    asyncio.run(cancel_probe())
+    assert backend.breaker.state == backend.breaker.HALF_OPEN
+    assert backend.breaker.before_request() is True
+
+
+def test_limiter_describes_queue_per_priority():
+    limiter = PriorityLimiter(rate=1, burst=1)
+
+    async def queue_requests():
+        await limiter.acquire()
+        waiting = [asyncio.ensure_future(limiter.acquire(BACKGROUND)) for _ in range(2)]
+        await asyncio.sleep(0)
+        description = limiter.describe()
+        for future in waiting:
+            future.cancel()
+        await asyncio.gather(*waiting, return_exceptions=True)
+        return description
+
+    assert asyncio.run(queue_requests()) == "queue scheduled 0, interactive 0, background 2"
+
+
+def test_limiter_rejects_invalid_settings():
+    with pytest.raises(ValueError):
+        PriorityLimiter(rate=0, burst=1)
+    PriorityLimiter(rate=0, burst=0, enabled=False)
@@ -0,0 +1,67 @@
+import asyncio
+import httpx
+import json
+import pytest
+
+from rdmass import utils
+from rdmass.rdm import backends
+from rdmass.sampler import StatusSampler
+
+STATUS = {
+    "processing": {"current": 1, "max": 100, "ignored": 0, "total": 10},
+    "pokemon": {"active_iv": 10, "active_total": 100},
+    "devices": {"online": 3, "total": 4},
+}
+
+
+@pytest.fixture
+def responses():
+    # queued bodies served in order, the last one repeats
+    queue = []
+
+    def handler(_):
+        body = queue[0] if len(queue) == 1 else queue.pop(0)
+        return httpx.Response(200, content=body)
+
+    backend = next(iter(backends.values()))
+    backend.cache.clear()
+    backend.http_client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+    yield queue
+    asyncio.run(backend.close_client())
+
+
+def status_body(online):
+    status = dict(STATUS, devices={"online": online, "total": 4})
+    return json.dumps({"status": "ok", "data": {"status": status}}).encode()
+
+
+def test_sampler_survives_broken_response(responses):
+    responses.extend([b"<html>bad gateway</html>", status_body(3)])
+    sampler = StatusSampler(interval=0.01, history=10)
+
+    async def run_sampler():
+        sampler.start()
+        await asyncio.sleep(0.1)
+        crashed = sampler._task.done()
+        sampler.stop()
+        return crashed
+
+    assert asyncio.run(run_sampler()) is False
+    assert sampler.latest.status["devices"]["online"] == 3
+
+
+def test_live_status_skips_fresh_sample(responses, monkeypatch):
+    sampler = StatusSampler(interval=60, history=10)
+    monkeypatch.setattr(utils, "sampler", sampler)
+    monkeypatch.setitem(utils.config.status_sampler, "enabled", True)
+    responses.append(status_body(1))
+    asyncio.run(sampler.sample())
+
+    responses.append(status_body(4))
+    responses.pop(0)
+    # fresh sample is kept for /rdm-status, only Refresh fetches again
+    assert "**Devices** 1/4" in asyncio.run(utils.get_status_message())
+    for backend in backends.values():
+        backend.cache.clear()
+    assert "**Devices** 4/4 [+3 in 0m]" in asyncio.run(utils.get_status_message(live=True))
+    assert len(sampler.samples) == 2
@@ -0,0 +1,49 @@
+from rdmass.search import search_labels
+
+
+def labels(rows):
+    return [row["label"] for row in rows]
+
+
+def search(names, query):
+    return labels(search_labels([{"label": name, "value": name} for name in names], query))
+
+
+def test_empty_query_returns_all_rows_in_order():
+    names = ["Quests", "IV", "Raids"]
+    assert search(names, None) == ["Quests", "IV", "Raids"]
+    assert search(names, "  ") == ["Quests", "IV", "Raids"]
+
+
+def test_short_terms_match_inside_words():
+    names = ["Ab12", "QuestBerlin", "Other"]
+    assert search(names, "12") == ["Ab12"]
+    assert search(names, "be") == ["QuestBerlin"]
+    assert search(names, "b") == ["Ab12", "QuestBerlin"]
+
+
+def test_long_terms_match_substrings():
+    names = ["QuestBerlin", "Berlin IV", "Hamburg"]
+    assert search(names, "erli") == ["QuestBerlin", "Berlin IV"]
+    assert search(names, "munich") == []
+
+
+def test_every_term_has_to_match():
+    names = ["Berlin IV", "Berlin Quests", "Hamburg IV"]
+    assert search(names, "berlin iv") == ["Berlin IV"]
+    assert search(names, "iv ham") == ["Hamburg IV"]
+
+
+def test_search_is_case_insensitive():
+    names = ["Berlin IV"]
+    assert search(names, "BERLIN") == ["Berlin IV"]
+
+
+def test_ranking_prefix_then_token_prefix_then_substring():
+    names = ["QuestBerlin", "Old Berlin", "Berlin Center"]
+    assert search(names, "berlin") == ["Berlin Center", "Old Berlin", "QuestBerlin"]
+
+
+def test_custom_key_and_missing_labels():
+    rows = [{"name": "Device 1"}, {"name": None}, {}]
+    assert search_labels(rows, "dev", key="name") == [{"name": "Device 1"}]